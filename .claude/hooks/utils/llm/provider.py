@@ -20,12 +20,17 @@ Priority Logic:
 3. If neither is configured -> return None
 """
 
+import functools
 import os
 import sys
 from typing import Optional
 from dotenv import load_dotenv
 
+# Provider name -> sibling submodule that implements it
+_PROVIDER_MODULES = {"anthropic": "anth", "openai": "oai"}
 
+
+@functools.lru_cache(maxsize=1)
 def get_enabled_provider() -> Optional[str]:
     """
     Determine which LLM provider to use based on environment configuration.
@@ -35,6 +40,9 @@ def get_enabled_provider() -> Optional[str]:
     2. If OPENAI_ENABLED=true AND OPENAI_API_KEY exists -> "openai"
     3. Otherwise -> None
 
+    The result is cached for the life of the process; call
+    get_enabled_provider.cache_clear() after changing the environment.
+
     Returns:
         str: "anthropic", "openai", or None if no provider is configured
     """
@@ -57,34 +65,39 @@ def get_enabled_provider() -> Optional[str]:
     return None
 
 
-def _import_anth():
-    """Import anthropic module, handling both package and standalone contexts."""
-    try:
-        from . import anth
-        return anth
-    except ImportError:
-        # Running as standalone script
-        import importlib.util
-        from pathlib import Path
-        spec = importlib.util.spec_from_file_location("anth", Path(__file__).parent / "anth.py")
-        anth = importlib.util.module_from_spec(spec)
-        spec.loader.exec_module(anth)
-        return anth
-
-
-def _import_oai():
-    """Import openai module, handling both package and standalone contexts."""
-    try:
-        from . import oai
-        return oai
-    except ImportError:
-        # Running as standalone script
-        import importlib.util
-        from pathlib import Path
-        spec = importlib.util.spec_from_file_location("oai", Path(__file__).parent / "oai.py")
-        oai = importlib.util.module_from_spec(spec)
-        spec.loader.exec_module(oai)
-        return oai
+def _load_sibling(name: str):
+    """Import a sibling module, handling both package and standalone contexts."""
+    if __package__:
+        import importlib
+        return importlib.import_module(f".{name}", __package__)
+
+    # Running as standalone script
+    import importlib.util
+    from pathlib import Path
+    spec = importlib.util.spec_from_file_location(name, Path(__file__).parent / f"{name}.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def __getattr__(name: str):
+    """
+    Lazily load the provider submodules (PEP 562).
+
+    The first access to `provider.anth` or `provider.oai` imports the module and
+    stores it as a module global, so later lookups never reach this hook and the
+    unused provider's SDK is never imported.
+    """
+    if name in _PROVIDER_MODULES.values():
+        module = _load_sibling(name)
+        globals()[name] = module
+        return module
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _get_provider_module(provider: str):
+    """Return the submodule for the given provider, importing it on first use."""
+    return getattr(sys.modules[__name__], _PROVIDER_MODULES[provider])
 
 
 def prompt_llm(prompt_text: str) -> Optional[str]:
@@ -99,14 +112,9 @@ def prompt_llm(prompt_text: str) -> Optional[str]:
     """
     provider = get_enabled_provider()
 
-    if provider == "anthropic":
-        anth = _import_anth()
-        return anth.prompt_llm(prompt_text)
-    elif provider == "openai":
-        oai = _import_oai()
-        return oai.prompt_llm(prompt_text)
-    else:
+    if provider is None:
         return None
+    return _get_provider_module(provider).prompt_llm(prompt_text)
 
 
 def generate_completion_message() -> Optional[str]:
@@ -118,18 +126,20 @@ def generate_completion_message() -> Optional[str]:
     """
     provider = get_enabled_provider()
 
-    if provider == "anthropic":
-        anth = _import_anth()
-        return anth.generate_completion_message()
-    elif provider == "openai":
-        oai = _import_oai()
-        return oai.generate_completion_message()
-    else:
+    if provider is None:
         return None
+    return _get_provider_module(provider).generate_completion_message()
 
 
 def main():
     """Command line interface for testing."""
+    # Fast path: ADW passes the already-resolved provider to child processes,
+    # so shell loops calling --provider don't re-read .env every time
+    cached_provider = os.environ.get("ADW_CACHED_PROVIDER")
+    if len(sys.argv) > 1 and sys.argv[1] == "--provider" and cached_provider:
+        print(cached_provider)
+        return
+
     if len(sys.argv) > 1:
         if sys.argv[1] == "--test":
             # Test provider detection
@@ -5,51 +5,88 @@ Supports multiple LLM providers:
 - OpenAI (via API) - used when OPENAI_ENABLED=true and Anthropic is disabled
 """
 
+from __future__ import annotations
+
+import functools
 import subprocess
 import sys
 import os
-import json
 import re
-from typing import Optional, List, Dict, Any, Tuple
-from dotenv import load_dotenv
-from data_types import (
-    AgentPromptRequest,
-    AgentPromptResponse,
-    AgentTemplateRequest,
-    ClaudeCodeResultMessage,
-)
-from llm_provider import (
-    get_active_provider,
-    is_anthropic_enabled,
-    prompt_openai,
-    get_openai_model_for_claude_model,
-)
-
-# Load environment variables
-load_dotenv()
-
-# Get Claude Code CLI path from environment
-CLAUDE_PATH = os.getenv("CLAUDE_CODE_PATH", "claude")
+import shutil
+import orjson
+from types import MappingProxyType
+from typing import TYPE_CHECKING, Optional, List, Dict, Any, BinaryIO, Mapping, Tuple
+
+if TYPE_CHECKING:
+    from data_types import (
+        AgentPromptRequest,
+        AgentPromptResponse,
+        AgentTemplateRequest,
+    )
+
+# Matches the leading slash command of a prompt, e.g. "/feature"
+_SLASH_RE = re.compile(r"^(/\w+)")
+
+# Prompt file path -> hash of the prompt last written there by save_prompt
+_PROMPT_WRITE_CACHE: Dict[str, int] = {}
+
+# Only the tail of Claude Code's stderr is included in error messages
+_STDERR_TAIL_BYTES = 4096
+
+# Project root (parent of adws), where agent outputs are written
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Note: data_types (pydantic) and llm_provider (which loads .env) are imported lazily so
+# that importing this module for the JSONL helpers stays lightweight.
+
+
+@functools.lru_cache(maxsize=1)
+def _ensure_env_loaded() -> None:
+    """Load environment variables from .env once, on first use."""
+    from llm_provider import load_env_once
+
+    load_env_once()
 
 
+def _get_claude_path() -> str:
+    """Get Claude Code CLI path from environment."""
+    _ensure_env_loaded()
+    return os.getenv("CLAUDE_CODE_PATH", "claude")
+
+
+def __getattr__(name: str):
+    """Resolve CLAUDE_PATH lazily so it still honors values from .env."""
+    if name == "CLAUDE_PATH":
+        return _get_claude_path()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+@functools.lru_cache(maxsize=256)
+def _ensure_dir(path: str) -> None:
+    """Create a directory (and parents) once per process."""
+    os.makedirs(path, exist_ok=True)
+
+
+@functools.lru_cache(maxsize=1)
 def check_claude_installed() -> Optional[str]:
     """Check if Claude Code CLI is installed. Return error message if not.
 
     Only performs the check if Anthropic is enabled. If Anthropic is disabled,
     returns None (no error) since Claude CLI is not required.
+
+    The result is cached for the life of the process; call
+    check_claude_installed.cache_clear() after changing CLAUDE_CODE_PATH.
     """
+    from llm_provider import is_anthropic_enabled
+
     # Skip check if Anthropic is disabled
     if not is_anthropic_enabled():
         return None
 
-    try:
-        result = subprocess.run(
-            [CLAUDE_PATH, "--version"], capture_output=True, text=True
-        )
-        if result.returncode != 0:
-            return f"Error: Claude Code CLI is not installed. Expected at: {CLAUDE_PATH}"
-    except FileNotFoundError:
-        return f"Error: Claude Code CLI is not installed. Expected at: {CLAUDE_PATH}"
+    # Resolve the executable on PATH instead of spawning `claude --version`
+    claude_path = _get_claude_path()
+    if shutil.which(claude_path) is None:
+        return f"Error: Claude Code CLI is not installed. Expected at: {claude_path}"
     return None
 
 
@@ -60,9 +97,9 @@ def parse_jsonl_output(output_file: str) -> Tuple[List[Dict[str, Any]], Optional
         Tuple of (all_messages, result_message) where result_message is None if not found
     """
     try:
-        with open(output_file, "r") as f:
-            # Read all lines and parse each as JSON
-            messages = [json.loads(line) for line in f if line.strip()]
+        with open(output_file, "rb") as f:
+            # Read all lines and parse each as JSON (orjson parses bytes directly)
+            messages = [orjson.loads(line) for line in f if line.strip()]
             
             # Find the result message (should be the last one)
             result_message = None
@@ -77,11 +114,18 @@ def parse_jsonl_output(output_file: str) -> Tuple[List[Dict[str, Any]], Optional
         return [], None
 
 
-def convert_jsonl_to_json(jsonl_file: str) -> str:
+def convert_jsonl_to_json(
+    jsonl_file: str, messages: Optional[List[Dict[str, Any]]] = None
+) -> str:
     """Convert JSONL file to JSON array file.
     
     Creates a .json file with the same name as the .jsonl file,
     containing all messages as a JSON array.
+
+    Args:
+        jsonl_file: Path to the JSONL file
+        messages: Already-parsed messages from the file; when given the
+            JSONL file is not read again
     
     Returns:
         Path to the created JSON file
@@ -89,70 +133,103 @@ def convert_jsonl_to_json(jsonl_file: str) -> str:
     # Create JSON filename by replacing .jsonl with .json
     json_file = jsonl_file.replace('.jsonl', '.json')
     
-    # Parse the JSONL file
-    messages, _ = parse_jsonl_output(jsonl_file)
+    # Parse the JSONL file unless the caller already did
+    if messages is None:
+        messages, _ = parse_jsonl_output(jsonl_file)
     
     # Write as JSON array
-    with open(json_file, 'w') as f:
-        json.dump(messages, f, indent=2)
+    with open(json_file, 'wb') as f:
+        f.write(orjson.dumps(messages, option=orjson.OPT_INDENT_2))
     
     print(f"Created JSON file: {json_file}")
     return json_file
 
 
-def get_claude_env() -> Dict[str, str]:
+def get_claude_env() -> Mapping[str, str]:
     """Get environment variables for Claude Code execution.
 
-    Returns a dictionary containing the parent environment merged with
+    Returns a read-only mapping containing the parent environment merged with
     required environment variables from .env configuration.
 
     This ensures Windows-specific variables (APPDATA, LOCALAPPDATA, TEMP, etc.)
     are preserved while also including our custom configuration.
 
+    The merged environment is cached per configuration, so repeated calls with
+    unchanged settings don't copy os.environ again.
+
     Note: Claude Code CLI requires ANTHROPIC_API_KEY. OpenAI vars are passed through
     for hooks and other operations that may use OpenAI as an alternative provider.
     """
-    # Start with the full parent environment to preserve Windows system vars
-    env = os.environ.copy()
+    _ensure_env_loaded()
+
+    return _build_claude_env(
+        os.getenv("ANTHROPIC_API_KEY"),
+        os.getenv("OPENAI_API_KEY"),
+        os.getenv("ANTHROPIC_ENABLED", "true"),
+        os.getenv("OPENAI_ENABLED", "false"),
+        os.getenv("CLAUDE_CODE_PATH", "claude"),
+        os.getenv("CLAUDE_BASH_MAINTAIN_PROJECT_WORKING_DIR", "true"),
+        os.getenv("E2B_API_KEY"),
+        os.getenv("GITHUB_PAT"),
+    )
+
 
+@functools.lru_cache(maxsize=4)
+def _build_claude_env(
+    anthropic_api_key: Optional[str],
+    openai_api_key: Optional[str],
+    anthropic_enabled: str,
+    openai_enabled: str,
+    claude_code_path: str,
+    claude_bash_maintain_dir: str,
+    e2b_api_key: Optional[str],
+    github_pat: Optional[str],
+) -> Mapping[str, str]:
+    """Build the Claude Code environment for one set of configuration values."""
     # Override/add our configuration variables
     config_vars = {
         # Anthropic Configuration (required for Claude Code CLI)
-        "ANTHROPIC_API_KEY": os.getenv("ANTHROPIC_API_KEY"),
+        "ANTHROPIC_API_KEY": anthropic_api_key,
 
         # OpenAI Configuration (for hooks and other LLM operations)
-        "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY"),
+        "OPENAI_API_KEY": openai_api_key,
 
         # LLM Provider Enable Flags
-        "ANTHROPIC_ENABLED": os.getenv("ANTHROPIC_ENABLED", "true"),
-        "OPENAI_ENABLED": os.getenv("OPENAI_ENABLED", "false"),
+        "ANTHROPIC_ENABLED": anthropic_enabled,
+        "OPENAI_ENABLED": openai_enabled,
 
         # Claude Code Configuration
-        "CLAUDE_CODE_PATH": os.getenv("CLAUDE_CODE_PATH", "claude"),
-        "CLAUDE_BASH_MAINTAIN_PROJECT_WORKING_DIR": os.getenv("CLAUDE_BASH_MAINTAIN_PROJECT_WORKING_DIR", "true"),
+        "CLAUDE_CODE_PATH": claude_code_path,
+        "CLAUDE_BASH_MAINTAIN_PROJECT_WORKING_DIR": claude_bash_maintain_dir,
 
         # Agent Cloud Sandbox Environment (optional)
-        "E2B_API_KEY": os.getenv("E2B_API_KEY"),
+        "E2B_API_KEY": e2b_api_key,
     }
 
+    # Resolved provider for hook scripts (.claude/hooks/utils/llm/provider.py),
+    # letting `provider.py --provider` skip reading .env in child processes
+    from llm_provider import get_active_provider
+
+    config_vars["ADW_CACHED_PROVIDER"] = get_active_provider() or "none"
+
     # Only add GitHub tokens if GITHUB_PAT exists
-    github_pat = os.getenv("GITHUB_PAT")
     if github_pat:
         config_vars["GITHUB_PAT"] = github_pat
         config_vars["GH_TOKEN"] = github_pat  # Claude Code uses GH_TOKEN
 
-    # Merge config vars into env (only non-None values)
-    for k, v in config_vars.items():
-        if v is not None:
-            env[k] = v
+    # Merge non-None config vars over the full parent environment, which is
+    # kept to preserve Windows system vars (APPDATA, TEMP, etc.)
+    overrides = {k: v for k, v in config_vars.items() if v is not None}
+    env = {**os.environ, **overrides}
 
-    return env
+    # Read-only so the cached environment can be shared between calls
+    return MappingProxyType(env)
 
 
 def save_prompt(prompt: str, adw_id: str, agent_name: str = "ops") -> None:
     """Save a prompt to the appropriate logging directory."""
     # Extract slash command from prompt
-    match = re.match(r'^(/\w+)', prompt)
+    match = _SLASH_RE.match(prompt)
     if not match:
         return
     
@@ -161,14 +238,19 @@ def save_prompt(prompt: str, adw_id: str, agent_name: str = "ops") -> None:
     command_name = slash_command[1:]
     
     # Create directory structure at project root (parent of adws)
-    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    prompt_dir = os.path.join(project_root, "agents", adw_id, agent_name, "prompts")
-    os.makedirs(prompt_dir, exist_ok=True)
+    prompt_dir = os.path.join(_PROJECT_ROOT, "agents", adw_id, agent_name, "prompts")
+    _ensure_dir(prompt_dir)
     
-    # Save prompt to file
+    # Skip the write if this exact prompt was already saved to the file
     prompt_file = os.path.join(prompt_dir, f"{command_name}.txt")
+    prompt_hash = hash(prompt)
+    if _PROMPT_WRITE_CACHE.get(prompt_file) == prompt_hash:
+        return
+
+    # Save prompt to file
     with open(prompt_file, "w", encoding="utf-8") as f:
         f.write(prompt)
+    _PROMPT_WRITE_CACHE[prompt_file] = prompt_hash
 
     print(f"Saved prompt to: {prompt_file}")
 
@@ -181,13 +263,16 @@ def execute_prompt_openai(request: AgentPromptRequest) -> AgentPromptResponse:
     Note: OpenAI cannot execute slash commands or file operations that Claude Code CLI can.
     This function is primarily for LLM prompt execution only.
     """
+    from data_types import AgentPromptResponse
+    from llm_provider import prompt_openai, get_openai_model_for_claude_model
+
     # Save prompt before execution
     save_prompt(request.prompt, request.adw_id, request.agent_name)
 
     # Create output directory if needed
     output_dir = os.path.dirname(request.output_file)
     if output_dir:
-        os.makedirs(output_dir, exist_ok=True)
+        _ensure_dir(output_dir)
 
     # Map Claude model to OpenAI model
     openai_model = get_openai_model_for_claude_model(request.model)
@@ -214,15 +299,19 @@ def execute_prompt_openai(request: AgentPromptRequest) -> AgentPromptResponse:
         "usage": result.get("usage"),
     }
 
-    with open(request.output_file, "w", encoding="utf-8") as f:
-        f.write(json.dumps(output_data, ensure_ascii=False) + "\n")
+    # Serialize once and reuse the payload for both the JSONL and JSON files
+    # (orjson always emits UTF-8, matching the previous ensure_ascii=False)
+    payload = orjson.dumps(output_data)
+
+    with open(request.output_file, "wb") as f:
+        f.write(payload + b"\n")
 
     print(f"Output saved to: {request.output_file}")
 
     # Also create JSON file for consistency
     json_file = request.output_file.replace('.jsonl', '.json')
-    with open(json_file, 'w', encoding="utf-8") as f:
-        json.dump([output_data], f, indent=2, ensure_ascii=False)
+    with open(json_file, 'wb') as f:
+        f.write(b"[\n  " + payload + b"\n]")
     print(f"Created JSON file: {json_file}")
 
     return AgentPromptResponse(
@@ -232,6 +321,14 @@ def execute_prompt_openai(request: AgentPromptRequest) -> AgentPromptResponse:
     )
 
 
+def _read_tail(f: BinaryIO, max_bytes: int) -> str:
+    """Read at most the last max_bytes of an open binary file as text."""
+    f.seek(0, os.SEEK_END)
+    size = f.tell()
+    f.seek(max(0, size - max_bytes))
+    return f.read().decode("utf-8", errors="replace")
+
+
 def prompt_claude_code(request: AgentPromptRequest) -> AgentPromptResponse:
     """Execute Claude Code with the given prompt configuration.
 
@@ -239,6 +336,9 @@ def prompt_claude_code(request: AgentPromptRequest) -> AgentPromptResponse:
     - If provider is explicitly set, uses that provider
     - Otherwise, uses the active provider from environment config
     """
+    from data_types import AgentPromptResponse
+    from llm_provider import get_active_provider
+
     # Determine which provider to use
     provider = request.provider
     if provider == "anthropic":
@@ -268,10 +368,10 @@ def prompt_claude_code(request: AgentPromptRequest) -> AgentPromptResponse:
     # Create output directory if needed
     output_dir = os.path.dirname(request.output_file)
     if output_dir:
-        os.makedirs(output_dir, exist_ok=True)
+        _ensure_dir(output_dir)
 
     # Build command - always use stream-json format and verbose
-    cmd = [CLAUDE_PATH, "-p", request.prompt]
+    cmd = [_get_claude_path(), "-p", request.prompt]
     cmd.extend(["--model", request.model])
     cmd.extend(["--output-format", "stream-json"])
     cmd.append("--verbose")
@@ -284,20 +384,42 @@ def prompt_claude_code(request: AgentPromptRequest) -> AgentPromptResponse:
     env = get_claude_env()
 
     try:
-        # Execute Claude Code and pipe output to file
-        with open(request.output_file, "w") as f:
-            result = subprocess.run(
-                cmd, stdout=f, stderr=subprocess.PIPE, text=True, env=env
-            )
-
-        if result.returncode == 0:
+        # Execute Claude Code, teeing its stream-json output to the file and
+        # parsing each line as it arrives so the file never has to be re-read.
+        # Stderr goes to a sibling .stderr file so verbose output is neither
+        # buffered in memory nor able to fill a pipe and block the child.
+        messages = []
+        result_message = None
+        stderr_file = request.output_file + ".stderr"
+        with open(request.output_file, "wb") as f, open(stderr_file, "wb+") as err:
+            with subprocess.Popen(
+                cmd, stdout=subprocess.PIPE, stderr=err, env=env
+            ) as proc:
+                for line in proc.stdout:
+                    f.write(line)
+                    if not line.strip():
+                        continue
+                    try:
+                        message = orjson.loads(line)
+                    except orjson.JSONDecodeError:
+                        continue
+                    messages.append(message)
+                    if message.get("type") == "result":
+                        result_message = message
+
+            returncode = proc.returncode
+            if returncode != 0:
+                stderr = _read_tail(err, _STDERR_TAIL_BYTES)
+
+        # Keep the sidecar only when it holds stderr from a failed run
+        if returncode == 0 or os.path.getsize(stderr_file) == 0:
+            os.remove(stderr_file)
+
+        if returncode == 0:
             print(f"Output saved to: {request.output_file}")
             
-            # Parse the JSONL file
-            messages, result_message = parse_jsonl_output(request.output_file)
-            
             # Convert JSONL to JSON array file
-            json_file = convert_jsonl_to_json(request.output_file)
+            json_file = convert_jsonl_to_json(request.output_file, messages=messages)
             
             if result_message:
                 # Extract session_id from result message
@@ -322,7 +444,7 @@ def prompt_claude_code(request: AgentPromptRequest) -> AgentPromptResponse:
                     session_id=None
                 )
         else:
-            error_msg = f"Claude Code error: {result.stderr}"
+            error_msg = f"Claude Code error: {stderr}"
             print(error_msg, file=sys.stderr)
             return AgentPromptResponse(output=error_msg, success=False, session_id=None)
 
@@ -336,6 +458,12 @@ def prompt_claude_code(request: AgentPromptRequest) -> AgentPromptResponse:
         return AgentPromptResponse(output=error_msg, success=False, session_id=None)
 
 
+@functools.lru_cache(maxsize=128)
+def _render_prompt(slash_command: str, args: Tuple[str, ...]) -> str:
+    """Render a slash command and its arguments into a prompt string."""
+    return f"{slash_command} {' '.join(args)}"
+
+
 def execute_template(request: AgentTemplateRequest) -> AgentPromptResponse:
     """Execute a Claude Code template with slash command and arguments.
 
@@ -343,8 +471,11 @@ def execute_template(request: AgentTemplateRequest) -> AgentPromptResponse:
     the slash command and args are passed as a regular prompt. OpenAI won't be able
     to execute the actual CLI commands but can process the text.
     """
+    from data_types import AgentPromptRequest
+    from llm_provider import get_active_provider
+
     # Construct prompt from slash command and args
-    prompt = f"{request.slash_command} {' '.join(request.args)}"
+    prompt = _render_prompt(request.slash_command, tuple(request.args))
 
     # Determine provider - use template's provider or detect from environment
     provider = request.provider
@@ -354,9 +485,8 @@ def execute_template(request: AgentTemplateRequest) -> AgentPromptResponse:
             provider = "openai"
 
     # Create output directory with adw_id at project root
-    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    output_dir = os.path.join(project_root, "agents", request.adw_id, request.agent_name)
-    os.makedirs(output_dir, exist_ok=True)
+    output_dir = os.path.join(_PROJECT_ROOT, "agents", request.adw_id, request.agent_name)
+    _ensure_dir(output_dir)
 
     # Build output file path
     output_file = os.path.join(output_dir, "raw_output.jsonl")
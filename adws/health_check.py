@@ -4,6 +4,7 @@
 # dependencies = [
 #     "python-dotenv",
 #     "pydantic",
+#     "orjson",
 # ]
 # ///
 
@@ -20,24 +21,62 @@ This script performs comprehensive health checks:
 4. Returns structured results
 """
 
+import functools
+import io
 import os
 import sys
-import json
+import shutil
 import subprocess
 import tempfile
+import threading
+from collections.abc import Iterator, Mapping
 from typing import Dict, List, Optional, Any
 from datetime import datetime
 from pathlib import Path
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 
-from dotenv import load_dotenv
+import orjson
 from pydantic import BaseModel
 
 # Import git repo functions from github module
 from github import get_repo_url, extract_repo_path, make_issue_comment
+from llm_provider import (
+    is_anthropic_enabled,
+    is_openai_enabled,
+    get_anthropic_api_key,
+    get_openai_api_key,
+    load_env_once,
+    openai_api_request,
+)
 
 # Load environment variables
-load_dotenv()
+load_env_once()
+
+
+class _EnvOverlay(Mapping):
+    """Read-only view of os.environ with a few variables overridden.
+
+    subprocess accepts any mapping for env, so this avoids copying the whole
+    process environment just to add one or two variables.
+    """
+
+    def __init__(self, extra: Dict[str, str]):
+        self._extra = extra
+
+    def __getitem__(self, key: str) -> str:
+        if key in self._extra:
+            return self._extra[key]
+        return os.environ[key]
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self._extra
+        for key in os.environ:
+            if key not in self._extra:
+                yield key
+
+    def __len__(self) -> int:
+        return len(self._extra) + sum(1 for key in os.environ if key not in self._extra)
 
 
 class CheckResult(BaseModel):
@@ -59,36 +98,38 @@ class HealthCheckResult(BaseModel):
     errors: List[str] = []
 
 
+# Always required vars: (name, description)
+_REQUIRED_VARS = (
+    ("CLAUDE_CODE_PATH", "Path to Claude Code CLI (defaults to 'claude')"),
+)
+
+# Required vars that have a default, so are never reported missing
+_VARS_WITH_DEFAULTS = frozenset({"CLAUDE_CODE_PATH"})
+
+_OPTIONAL_VARS = (
+    ("GITHUB_PAT", "(Optional) GitHub Personal Access Token - only needed if you want ADW to use a different GitHub account than 'gh auth login'"),
+    ("E2B_API_KEY", "(Optional) E2B API Key for sandbox environments"),
+    ("CLOUDFLARED_TUNNEL_TOKEN", "(Optional) Cloudflare tunnel token for webhook exposure"),
+)
+
+
 def check_env_vars() -> CheckResult:
     """Check required environment variables including LLM provider configuration."""
     # Read provider enable flags (default Anthropic=true for backward compatibility)
-    anthropic_enabled = os.getenv("ANTHROPIC_ENABLED", "true").lower() == "true"
-    openai_enabled = os.getenv("OPENAI_ENABLED", "false").lower() == "true"
+    anthropic_enabled = is_anthropic_enabled()
+    openai_enabled = is_openai_enabled()
 
     # Check API keys
-    anthropic_key = os.getenv("ANTHROPIC_API_KEY")
-    openai_key = os.getenv("OPENAI_API_KEY")
-
-    # Always required vars
-    base_required_vars = {
-        "CLAUDE_CODE_PATH": "Path to Claude Code CLI (defaults to 'claude')",
-    }
-
-    optional_vars = {
-        "GITHUB_PAT": "(Optional) GitHub Personal Access Token - only needed if you want ADW to use a different GitHub account than 'gh auth login'",
-        "E2B_API_KEY": "(Optional) E2B API Key for sandbox environments",
-        "CLOUDFLARED_TUNNEL_TOKEN": "(Optional) Cloudflare tunnel token for webhook exposure",
-    }
+    anthropic_key = get_anthropic_api_key()
+    openai_key = get_openai_api_key()
 
+    env = os.environ
     missing_required = []
     missing_optional = []
 
     # Check base required vars
-    for var, desc in base_required_vars.items():
-        if not os.getenv(var):
-            if var == "CLAUDE_CODE_PATH":
-                # This has a default, so not critical
-                continue
+    for var, desc in _REQUIRED_VARS:
+        if var not in _VARS_WITH_DEFAULTS and not env.get(var):
             missing_required.append(f"{var} ({desc})")
 
     # Check LLM provider configuration
@@ -108,8 +149,8 @@ def check_env_vars() -> CheckResult:
         missing_required.append("No LLM provider configured. Enable at least one provider with its API key.")
 
     # Check optional vars
-    for var, desc in optional_vars.items():
-        if not os.getenv(var):
+    for var, desc in _OPTIONAL_VARS:
+        if not env.get(var):
             missing_optional.append(f"{var} ({desc})")
 
     # Combine all errors
@@ -129,7 +170,7 @@ def check_env_vars() -> CheckResult:
         details={
             "missing_required": all_errors,
             "missing_optional": missing_optional,
-            "claude_code_path": os.getenv("CLAUDE_CODE_PATH", "claude"),
+            "claude_code_path": env.get("CLAUDE_CODE_PATH", "claude"),
             "anthropic_enabled": anthropic_enabled,
             "openai_enabled": openai_enabled,
             "anthropic_key_set": bool(anthropic_key),
@@ -170,20 +211,11 @@ def check_claude_code() -> CheckResult:
     """Test Claude Code CLI functionality."""
     claude_path = os.getenv("CLAUDE_CODE_PATH", "claude")
 
-    # On Windows, use shell=True for better command resolution
-    use_shell = sys.platform == "win32"
-
-    # First check if Claude Code is installed
-    try:
-        result = subprocess.run(
-            [claude_path, "--version"], capture_output=True, text=True, shell=use_shell
-        )
-        if result.returncode != 0:
-            return CheckResult(
-                success=False,
-                error=f"Claude Code CLI not functional at '{claude_path}'",
-            )
-    except FileNotFoundError:
+    # First check if Claude Code is installed (PATH lookup, no subprocess needed).
+    # shutil.which honors PATHEXT on Windows, so the resolved path can be run
+    # directly without going through a shell.
+    resolved_path = shutil.which(claude_path)
+    if resolved_path is None:
         return CheckResult(
             success=False,
             error=f"Claude Code CLI not found at '{claude_path}'. Please install or set CLAUDE_CODE_PATH correctly.",
@@ -193,20 +225,15 @@ def check_claude_code() -> CheckResult:
     test_prompt = "What is 2+2? Just respond with the number, nothing else."
 
     # Prepare environment
-    env = os.environ.copy()
+    extra_env = {}
     if os.getenv("GITHUB_PAT"):
-        env["GH_TOKEN"] = os.getenv("GITHUB_PAT")
+        extra_env["GH_TOKEN"] = os.getenv("GITHUB_PAT")
+    env = _EnvOverlay(extra_env)
 
     try:
-        # Create temporary file for output
-        with tempfile.NamedTemporaryFile(
-            mode="w", suffix=".jsonl", delete=False
-        ) as tmp:
-            output_file = tmp.name
-
         # Run Claude Code
         cmd = [
-            claude_path,
+            resolved_path,
             "-p",
             test_prompt,
             "--model",
@@ -217,38 +244,59 @@ def check_claude_code() -> CheckResult:
             "--dangerously-skip-permissions",
         ]
 
-        with open(output_file, "w") as f:
-            result = subprocess.run(
-                cmd, stdout=f, stderr=subprocess.PIPE, text=True, env=env, timeout=60, shell=use_shell
-            )
-
         # Parse output to verify it worked - don't rely solely on exit code
         # Claude may return non-zero even on success in some environments
         claude_responded = False
         response_text = ""
+        timed_out = threading.Event()
 
-        try:
-            with open(output_file, "r") as f:
-                for line in f:
-                    if line.strip():
-                        try:
-                            msg = json.loads(line)
-                            if msg.get("type") == "result":
-                                claude_responded = True
-                                response_text = msg.get("result", "")
-                                break
-                        except json.JSONDecodeError:
-                            continue
-        finally:
-            # Clean up temp file
-            if os.path.exists(output_file):
-                os.unlink(output_file)
-
-        if not claude_responded and result.returncode != 0:
-            return CheckResult(
-                success=False,
-                error=f"Claude Code test failed (exit {result.returncode}): {result.stderr}"
-            )
+        # Read stdout as it streams and stop at the result message, so nothing
+        # is written to disk. Stderr is spooled to an anonymous temp file so it
+        # can't fill a pipe and stall the child while we read stdout.
+        with tempfile.TemporaryFile() as err, subprocess.Popen(
+            cmd, stdout=subprocess.PIPE, stderr=err, env=env
+        ) as proc:
+
+            def kill_on_timeout() -> None:
+                timed_out.set()
+                proc.kill()
+
+            timer = threading.Timer(60, kill_on_timeout)
+            timer.start()
+            try:
+                for line in proc.stdout:
+                    # Only the result line is worth decoding; skip the rest
+                    # with a plain byte search
+                    if b'"type":"result"' not in line:
+                        continue
+                    try:
+                        msg = orjson.loads(line)
+                        if msg.get("type") == "result":
+                            claude_responded = True
+                            response_text = msg.get("result", "")
+                            break
+                    except orjson.JSONDecodeError:
+                        continue
+            finally:
+                timer.cancel()
+
+            if claude_responded:
+                # We have what we need; don't wait for the CLI to shut down
+                proc.terminate()
+            returncode = proc.wait()
+
+            if not claude_responded and timed_out.is_set():
+                return CheckResult(
+                    success=False, error="Claude Code test timed out after 60 seconds"
+                )
+
+            if not claude_responded and returncode != 0:
+                err.seek(0)
+                stderr = err.read().decode("utf-8", errors="replace")
+                return CheckResult(
+                    success=False,
+                    error=f"Claude Code test failed (exit {returncode}): {stderr}"
+                )
 
         return CheckResult(
             success=claude_responded,
@@ -258,14 +306,11 @@ def check_claude_code() -> CheckResult:
             },
         )
 
-    except subprocess.TimeoutExpired:
-        return CheckResult(
-            success=False, error="Claude Code test timed out after 60 seconds"
-        )
     except Exception as e:
         return CheckResult(success=False, error=f"Claude Code test error: {str(e)}")
 
 
+@functools.lru_cache(maxsize=1)
 def is_wsl() -> bool:
     """Check if running inside WSL."""
     try:
@@ -275,15 +320,25 @@ def is_wsl() -> bool:
         return False
 
 
+# WSL detection reads /proc/version, so do it once at import
+_IS_WSL = is_wsl()
+
+
+@functools.lru_cache(maxsize=1)
 def get_gh_path() -> Optional[str]:
     """Find the GitHub CLI executable path."""
     # Try 'gh' directly first
     try:
-        result = subprocess.run(["gh", "--version"], capture_output=True, text=True)
+        result = subprocess.run(
+            ["gh", "--version"], capture_output=True, text=True, timeout=5
+        )
         if result.returncode == 0:
             return "gh"
     except FileNotFoundError:
         pass
+    except subprocess.TimeoutExpired:
+        # gh is on PATH but slow to start; let the auth check report the problem
+        return "gh"
 
     # On Windows, check common installation paths
     if sys.platform == "win32":
@@ -297,7 +352,7 @@ def get_gh_path() -> Optional[str]:
                 return path
 
     # If running in WSL, try Windows GitHub CLI via /mnt/c path
-    if is_wsl():
+    if _IS_WSL:
         wsl_windows_paths = [
             "/mnt/c/Program Files/GitHub CLI/gh.exe",
             "/mnt/c/Program Files (x86)/GitHub CLI/gh.exe",
@@ -309,33 +364,46 @@ def get_gh_path() -> Optional[str]:
     return None
 
 
-def get_gh_env() -> dict:
+_WIN_USERS_DIR = "/mnt/c/Users"
+# Profile folders under C:\Users that never belong to the gh user
+_WIN_SYSTEM_USERS = frozenset({"Public", "Default", "Default User", "All Users"})
+
+
+@functools.lru_cache(maxsize=1)
+def _wsl_gh_config_dir() -> Optional[str]:
+    """Find the Windows gh config directory when running in WSL."""
+    # Get Windows username from the mount path
+    try:
+        with os.scandir(_WIN_USERS_DIR) as entries:
+            win_user = next(
+                (e.name for e in entries if e.name not in _WIN_SYSTEM_USERS), None
+            )
+    except OSError:
+        return None
+
+    if win_user:
+        gh_config = f"{_WIN_USERS_DIR}/{win_user}/AppData/Roaming/GitHub CLI"
+        if os.path.exists(gh_config):
+            return gh_config
+
+    return None
+
+
+def get_gh_env() -> Mapping[str, str]:
     """Get environment for running gh CLI, handling WSL config path."""
-    env = os.environ.copy()
+    env = {}
 
     # If GITHUB_PAT is set, use it
     if os.getenv("GITHUB_PAT"):
         env["GH_TOKEN"] = os.getenv("GITHUB_PAT")
 
     # If running in WSL, point to Windows gh config
-    if is_wsl():
-        # Get Windows username from the mount path
-        try:
-            import pwd
-            # Try to find Windows user from common paths
-            for path in ["/mnt/c/Users"]:
-                if os.path.exists(path):
-                    users = [u for u in os.listdir(path) if u not in ["Public", "Default", "Default User", "All Users"]]
-                    if users:
-                        win_user = users[0]
-                        gh_config = f"/mnt/c/Users/{win_user}/AppData/Roaming/GitHub CLI"
-                        if os.path.exists(gh_config):
-                            env["GH_CONFIG_DIR"] = gh_config
-                        break
-        except Exception:
-            pass
-
-    return env
+    if _IS_WSL:
+        gh_config = _wsl_gh_config_dir()
+        if gh_config:
+            env["GH_CONFIG_DIR"] = gh_config
+
+    return _EnvOverlay(env)
 
 
 def check_github_cli() -> CheckResult:
@@ -355,7 +423,7 @@ def check_github_cli() -> CheckResult:
 
     try:
         result = subprocess.run(
-            [gh_path, "auth", "status"], capture_output=True, text=True, env=env
+            [gh_path, "auth", "status"], capture_output=True, text=True, env=env, timeout=10
         )
 
         authenticated = result.returncode == 0
@@ -365,6 +433,12 @@ def check_github_cli() -> CheckResult:
             error="GitHub CLI not authenticated. Run: gh auth login" if not authenticated else None,
             details={"installed": True, "authenticated": authenticated, "path": gh_path},
         )
+    except subprocess.TimeoutExpired:
+        return CheckResult(
+            success=False,
+            error="GitHub CLI auth check timed out after 10 seconds",
+            details={"installed": True, "path": gh_path},
+        )
     except Exception as e:
         return CheckResult(
             success=False,
@@ -375,7 +449,7 @@ def check_github_cli() -> CheckResult:
 
 def check_openai() -> CheckResult:
     """Test OpenAI API connectivity."""
-    openai_key = os.getenv("OPENAI_API_KEY")
+    openai_key = get_openai_api_key()
 
     if not openai_key:
         return CheckResult(
@@ -384,43 +458,42 @@ def check_openai() -> CheckResult:
         )
 
     try:
-        import urllib.request
-        import urllib.error
-
-        # Test with a simple API call to list models
-        req = urllib.request.Request(
-            "https://api.openai.com/v1/models",
-            headers={
-                "Authorization": f"Bearer {openai_key}",
-            },
+        # Probe the models endpoint with HEAD; only the status matters, so
+        # there's no need to download the full model list
+        headers = {"Authorization": f"Bearer {openai_key}"}
+        status, reason, _ = openai_api_request(
+            "HEAD", "/v1/models", headers=headers, timeout=30
         )
+        if status == 405:
+            # HEAD not allowed on this route; fall back to a regular GET
+            status, reason, _ = openai_api_request(
+                "GET", "/v1/models", headers=headers, timeout=30
+            )
 
-        with urllib.request.urlopen(req, timeout=30) as response:
-            if response.status == 200:
-                return CheckResult(
-                    success=True,
-                    details={"api_connected": True},
-                )
-            else:
-                return CheckResult(
-                    success=False,
-                    error=f"OpenAI API returned status {response.status}",
-                )
-
-    except urllib.error.HTTPError as e:
-        if e.code == 401:
+        if status == 200:
+            return CheckResult(
+                success=True,
+                details={"api_connected": True},
+            )
+        if status == 401:
             return CheckResult(
                 success=False,
                 error="OpenAI API key is invalid (401 Unauthorized)",
             )
+        if status >= 400:
+            return CheckResult(
+                success=False,
+                error=f"OpenAI API error: {status} {reason}",
+            )
         return CheckResult(
             success=False,
-            error=f"OpenAI API error: {e.code} {e.reason}",
+            error=f"OpenAI API returned status {status}",
         )
-    except urllib.error.URLError as e:
+
+    except OSError as e:
         return CheckResult(
             success=False,
-            error=f"OpenAI API connection failed: {str(e.reason)}",
+            error=f"OpenAI API connection failed: {str(e)}",
         )
     except Exception as e:
         return CheckResult(
@@ -430,13 +503,37 @@ def check_openai() -> CheckResult:
 
 
 def run_health_check() -> HealthCheckResult:
-    """Run all health checks and return results."""
+    """Run all health checks and return results.
+
+    The checks are independent and mostly wait on subprocesses or the network,
+    so they run concurrently; results are aggregated serially afterwards.
+    """
     result = HealthCheckResult(
         success=True, timestamp=datetime.now().isoformat(), checks={}
     )
 
+    # Get provider enable flags
+    anthropic_enabled = is_anthropic_enabled()
+    openai_enabled = is_openai_enabled()
+
+    checks = {
+        "environment": check_env_vars,
+        "git_repository": check_git_repo,
+        "github_cli": check_github_cli,
+    }
+    # Check Claude Code (Anthropic) - only if enabled
+    if anthropic_enabled:
+        checks["claude_code"] = check_claude_code
+    # Check OpenAI - only if enabled
+    if openai_enabled:
+        checks["openai"] = check_openai
+
+    with ThreadPoolExecutor(max_workers=len(checks)) as executor:
+        futures = {name: executor.submit(check) for name, check in checks.items()}
+        completed = {name: future.result() for name, future in futures.items()}
+
     # Check environment variables
-    env_check = check_env_vars()
+    env_check = completed["environment"]
     result.checks["environment"] = env_check
     if not env_check.success:
         result.success = False
@@ -450,7 +547,7 @@ def run_health_check() -> HealthCheckResult:
     # Don't add warnings for optional env vars - they're optional!
 
     # Check git repository
-    git_check = check_git_repo()
+    git_check = completed["git_repository"]
     result.checks["git_repository"] = git_check
     if not git_check.success:
         result.success = False
@@ -460,20 +557,15 @@ def run_health_check() -> HealthCheckResult:
         result.warnings.append(git_check.warning)
 
     # Check GitHub CLI - treat as warning, not failure (system can work without it for basic tasks)
-    gh_check = check_github_cli()
+    gh_check = completed["github_cli"]
     result.checks["github_cli"] = gh_check
     if not gh_check.success:
         # Don't fail overall health check, just warn
         if gh_check.error:
             result.warnings.append(gh_check.error)
 
-    # Get provider enable flags
-    anthropic_enabled = os.getenv("ANTHROPIC_ENABLED", "true").lower() == "true"
-    openai_enabled = os.getenv("OPENAI_ENABLED", "false").lower() == "true"
-
-    # Check Claude Code (Anthropic) - only if enabled
     if anthropic_enabled:
-        claude_check = check_claude_code()
+        claude_check = completed["claude_code"]
         result.checks["claude_code"] = claude_check
         if not claude_check.success:
             if claude_check.error:
@@ -484,9 +576,8 @@ def run_health_check() -> HealthCheckResult:
             details={"enabled": False, "reason": "ANTHROPIC_ENABLED=false - Claude Code check disabled"},
         )
 
-    # Check OpenAI - only if enabled
     if openai_enabled:
-        openai_check = check_openai()
+        openai_check = completed["openai"]
         result.checks["openai"] = openai_check
         if not openai_check.success:
             result.success = False
@@ -512,23 +603,27 @@ def main():
     )
     args = parser.parse_args()
 
-    print("[HEALTH] Running ADW System Health Check...\n")
+    # Flush the banner now so it shows while the checks run
+    print("[HEALTH] Running ADW System Health Check...\n", flush=True)
 
     result = run_health_check()
 
+    # Build the report in memory and write it once instead of once per line
+    buf = io.StringIO()
+
     # Print summary
-    print(
-        f"{'[OK]' if result.success else '[FAIL]'} Overall Status: {'HEALTHY' if result.success else 'UNHEALTHY'}"
+    buf.write(
+        f"{'[OK]' if result.success else '[FAIL]'} Overall Status: {'HEALTHY' if result.success else 'UNHEALTHY'}\n"
     )
-    print(f"[TIME] Timestamp: {result.timestamp}\n")
+    buf.write(f"[TIME] Timestamp: {result.timestamp}\n\n")
 
     # Print detailed results
-    print("[CHECKS] Check Results:")
-    print("-" * 50)
+    buf.write("[CHECKS] Check Results:\n")
+    buf.write("-" * 50 + "\n")
 
     for check_name, check_result in result.checks.items():
         status = "[OK]" if check_result.success else "[FAIL]"
-        print(f"\n{status} {check_name.replace('_', ' ').title()}:")
+        buf.write(f"\n{status} {check_name.replace('_', ' ').title()}:\n")
 
         # Print check-specific details
         for key, value in check_result.details.items():
@@ -536,40 +631,43 @@ def main():
                 "missing_required",
                 "missing_optional",
             ]:
-                print(f"   {key}: {value}")
+                buf.write(f"   {key}: {value}\n")
 
         if check_result.error:
-            print(f"   [FAIL] Error: {check_result.error}")
+            buf.write(f"   [FAIL] Error: {check_result.error}\n")
         if check_result.warning:
-            print(f"   [WARN] Warning: {check_result.warning}")
+            buf.write(f"   [WARN] Warning: {check_result.warning}\n")
 
     # Print warnings
     if result.warnings:
-        print("\n[WARN] Warnings:")
+        buf.write("\n[WARN] Warnings:\n")
         for warning in result.warnings:
-            print(f"   - {warning}")
+            buf.write(f"   - {warning}\n")
 
     # Print errors
     if result.errors:
-        print("\n[FAIL] Errors:")
+        buf.write("\n[FAIL] Errors:\n")
         for error in result.errors:
-            print(f"   - {error}")
+            buf.write(f"   - {error}\n")
 
     # Print next steps
     if not result.success:
-        print("\n[NEXT] Next Steps:")
+        buf.write("\n[NEXT] Next Steps:\n")
         if any("ANTHROPIC_API_KEY" in e for e in result.errors):
-            print("   1. Set ANTHROPIC_API_KEY in your .env file")
+            buf.write("   1. Set ANTHROPIC_API_KEY in your .env file\n")
         if any("GITHUB_PAT" in e for e in result.errors):
-            print("   2. Set GITHUB_PAT in your .env file")
+            buf.write("   2. Set GITHUB_PAT in your .env file\n")
         if any("GitHub CLI" in e for e in result.errors):
-            print("   3. Install GitHub CLI: brew install gh")
-            print("   4. Authenticate: gh auth login")
+            buf.write("   3. Install GitHub CLI: brew install gh\n")
+            buf.write("   4. Authenticate: gh auth login\n")
         if any("disler" in w for w in result.warnings):
-            print(
-                "   5. Fork/clone the repository and update git remote to your own repo"
+            buf.write(
+                "   5. Fork/clone the repository and update git remote to your own repo\n"
             )
 
+    sys.stdout.write(buf.getvalue())
+    sys.stdout.flush()
+
     # If issue number provided, post comment
     if args.issue_number:
         # Check if gh is available before trying to post
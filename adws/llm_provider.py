@@ -6,36 +6,113 @@ This module provides:
 - Provider-agnostic prompt execution interface
 """
 
+import http.client
 import os
-import json
-from typing import Literal, Optional, Dict, Any
+import threading
+import orjson
+from typing import Literal, NamedTuple, Optional, Dict, Any, Tuple
 from dotenv import load_dotenv
 
+# Set once .env has been read; inherited by child processes so they skip it too
+_DOTENV_LOADED_VAR = "_ADW_DOTENV_LOADED"
+
+
+def load_env_once() -> None:
+    """Load environment variables from .env unless this process tree already has."""
+    if os.environ.get(_DOTENV_LOADED_VAR):
+        return
+    load_dotenv()
+    os.environ[_DOTENV_LOADED_VAR] = "1"
+
+
 # Load environment variables
-load_dotenv()
+load_env_once()
 
 # Type for active provider
 LLMProvider = Literal["anthropic", "openai"]
 
+# OpenAI API host; connections are kept alive per thread (see openai_api_request)
+OPENAI_API_HOST = "api.openai.com"
+_openai_local = threading.local()
+
+
+class ProviderState(NamedTuple):
+    """Snapshot of the LLM provider configuration."""
+
+    anthropic_enabled: bool
+    openai_enabled: bool
+    anthropic_key: Optional[str]
+    openai_key: Optional[str]
+    active: Optional[LLMProvider]
+    configured_message: str
+
+
+def _read_provider_state() -> ProviderState:
+    """Read provider configuration from the environment."""
+    anthropic_enabled = os.getenv("ANTHROPIC_ENABLED", "true").lower() == "true"
+    openai_enabled = os.getenv("OPENAI_ENABLED", "false").lower() == "true"
+    anthropic_key = os.getenv("ANTHROPIC_API_KEY")
+    openai_key = os.getenv("OPENAI_API_KEY")
+
+    # Priority: Anthropic (if enabled and configured) > OpenAI (if enabled and configured)
+    active: Optional[LLMProvider] = None
+    if anthropic_enabled and anthropic_key:
+        active = "anthropic"
+    elif openai_enabled and openai_key:
+        active = "openai"
+
+    if active:
+        configured_message = f"Active provider: {active}"
+    else:
+        # Build helpful error message
+        errors = []
+        if anthropic_enabled and not anthropic_key:
+            errors.append("ANTHROPIC_ENABLED=true but ANTHROPIC_API_KEY is not set")
+        if openai_enabled and not openai_key:
+            errors.append("OPENAI_ENABLED=true but OPENAI_API_KEY is not set")
+        if not anthropic_enabled and not openai_enabled:
+            errors.append("No LLM provider enabled. Set ANTHROPIC_ENABLED=true or OPENAI_ENABLED=true")
+        configured_message = "; ".join(errors) if errors else "No LLM provider configured"
+
+    return ProviderState(
+        anthropic_enabled=anthropic_enabled,
+        openai_enabled=openai_enabled,
+        anthropic_key=anthropic_key,
+        openai_key=openai_key,
+        active=active,
+        configured_message=configured_message,
+    )
+
+
+# Provider configuration is read once at import (after .env is loaded)
+_PROVIDER_STATE = _read_provider_state()
+
+
+def reload_provider_state() -> ProviderState:
+    """Re-read provider configuration after the environment has changed."""
+    global _PROVIDER_STATE
+    _PROVIDER_STATE = _read_provider_state()
+    return _PROVIDER_STATE
+
 
 def is_anthropic_enabled() -> bool:
     """Check if Anthropic provider is enabled in environment."""
-    return os.getenv("ANTHROPIC_ENABLED", "true").lower() == "true"
+    return _PROVIDER_STATE.anthropic_enabled
 
 
 def is_openai_enabled() -> bool:
     """Check if OpenAI provider is enabled in environment."""
-    return os.getenv("OPENAI_ENABLED", "false").lower() == "true"
+    return _PROVIDER_STATE.openai_enabled
 
 
 def get_anthropic_api_key() -> Optional[str]:
     """Get Anthropic API key from environment."""
-    return os.getenv("ANTHROPIC_API_KEY")
+    return _PROVIDER_STATE.anthropic_key
 
 
 def get_openai_api_key() -> Optional[str]:
     """Get OpenAI API key from environment."""
-    return os.getenv("OPENAI_API_KEY")
+    return _PROVIDER_STATE.openai_key
 
 
 def get_active_provider() -> Optional[LLMProvider]:
@@ -46,15 +123,7 @@ def get_active_provider() -> Optional[LLMProvider]:
     Returns:
         "anthropic" or "openai" if a provider is properly configured, None otherwise.
     """
-    # Check Anthropic first (higher priority)
-    if is_anthropic_enabled() and get_anthropic_api_key():
-        return "anthropic"
-
-    # Check OpenAI as fallback
-    if is_openai_enabled() and get_openai_api_key():
-        return "openai"
-
-    return None
+    return _PROVIDER_STATE.active
 
 
 def get_openai_model_for_claude_model(claude_model: str) -> str:
@@ -82,6 +151,59 @@ def get_openai_model_for_claude_model(claude_model: str) -> str:
     return model_mapping.get(claude_model, "gpt-4o")
 
 
+def openai_api_request(
+    method: str,
+    path: str,
+    headers: Dict[str, str],
+    body: Optional[bytes] = None,
+    timeout: float = 120,
+) -> Tuple[int, str, bytes]:
+    """Send a request to the OpenAI API over a reused keep-alive connection.
+
+    Each thread keeps one HTTPS connection to the API, so repeated calls skip
+    the DNS lookup, TCP connect and TLS handshake. If a reused connection was
+    closed by the server while idle, the request is retried once on a fresh one.
+
+    Args:
+        method: HTTP method (e.g. "GET", "POST")
+        path: Request path (e.g. "/v1/chat/completions")
+        headers: Request headers
+        body: Optional request body
+        timeout: Socket timeout in seconds
+
+    Returns:
+        Tuple of (status, reason, response_body)
+
+    Raises:
+        OSError: If the connection fails or times out
+    """
+    conn = getattr(_openai_local, "conn", None)
+    reused = conn is not None
+    if conn is None:
+        conn = http.client.HTTPSConnection(OPENAI_API_HOST, timeout=timeout)
+        _openai_local.conn = conn
+    else:
+        conn.timeout = timeout
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout)
+
+    try:
+        conn.request(method, path, body=body, headers=headers)
+        response = conn.getresponse()
+        # Always drain the body so the connection can be reused
+        return response.status, response.reason, response.read()
+    except (ConnectionResetError, BrokenPipeError):
+        conn.close()
+        _openai_local.conn = None
+        if not reused:
+            raise
+        return openai_api_request(method, path, headers, body, timeout)
+    except Exception:
+        conn.close()
+        _openai_local.conn = None
+        raise
+
+
 def prompt_openai(
     prompt: str,
     model: str = "gpt-4o",
@@ -102,9 +224,6 @@ def prompt_openai(
             - output: The response text or error message
             - usage: Token usage information (if successful)
     """
-    import urllib.request
-    import urllib.error
-
     openai_key = get_openai_api_key()
 
     if not openai_key:
@@ -116,65 +235,62 @@ def prompt_openai(
 
     try:
         # Prepare the request
-        data = json.dumps({
+        data = orjson.dumps({
             "model": model,
             "messages": [{"role": "user", "content": prompt}],
             "max_tokens": max_tokens,
             "temperature": temperature,
-        }).encode("utf-8")
+        })
 
-        req = urllib.request.Request(
-            "https://api.openai.com/v1/chat/completions",
-            data=data,
+        status, reason, body = openai_api_request(
+            "POST",
+            "/v1/chat/completions",
             headers={
                 "Authorization": f"Bearer {openai_key}",
                 "Content-Type": "application/json",
             },
+            body=data,
+            timeout=120,
         )
 
-        with urllib.request.urlopen(req, timeout=120) as response:
-            result = json.loads(response.read().decode("utf-8"))
-
-            # Extract the response text
-            choices = result.get("choices", [])
-            if choices:
-                message = choices[0].get("message", {})
-                content = message.get("content", "")
-
-                return {
-                    "success": True,
-                    "output": content,
-                    "usage": result.get("usage"),
-                }
-            else:
-                return {
-                    "success": False,
-                    "output": "No response from OpenAI API",
-                    "usage": None,
-                }
-
-    except urllib.error.HTTPError as e:
-        error_body = ""
-        try:
-            error_body = e.read().decode("utf-8")
-        except Exception:
-            pass
-
-        if e.code == 401:
+        if status == 401:
             return {
                 "success": False,
                 "output": "OpenAI API key is invalid (401 Unauthorized)",
                 "usage": None,
             }
+        if status >= 400:
+            error_body = body.decode("utf-8", errors="replace")
+            return {
+                "success": False,
+                "output": f"OpenAI API error: {status} {reason} - {error_body}",
+                "usage": None,
+            }
+
+        result = orjson.loads(body)
+
+        # Extract the response text
+        choices = result.get("choices", [])
+        if choices:
+            message = choices[0].get("message", {})
+            content = message.get("content", "")
+
+            return {
+                "success": True,
+                "output": content,
+                "usage": result.get("usage"),
+            }
+        else:
+            return {
+                "success": False,
+                "output": "No response from OpenAI API",
+                "usage": None,
+            }
+
+    except OSError as e:
         return {
             "success": False,
-            "output": f"OpenAI API error: {e.code} {e.reason} - {error_body}",
-            "usage": None,
-        }
-    except urllib.error.URLError as e:
-        return {
-            "success": False,
-            "output": f"OpenAI API connection failed: {str(e.reason)}",
+            "output": f"OpenAI API connection failed: {str(e)}",
             "usage": None,
         }
     except Exception as e:
@@ -191,23 +307,5 @@ def check_provider_configured() -> tuple[bool, str]:
     Returns:
         Tuple of (is_configured, error_message)
     """
-    active = get_active_provider()
-
-    if active:
-        return True, f"Active provider: {active}"
-
-    # Build helpful error message
-    errors = []
-
-    if is_anthropic_enabled():
-        if not get_anthropic_api_key():
-            errors.append("ANTHROPIC_ENABLED=true but ANTHROPIC_API_KEY is not set")
-
-    if is_openai_enabled():
-        if not get_openai_api_key():
-            errors.append("OPENAI_ENABLED=true but OPENAI_API_KEY is not set")
-
-    if not is_anthropic_enabled() and not is_openai_enabled():
-        errors.append("No LLM provider enabled. Set ANTHROPIC_ENABLED=true or OPENAI_ENABLED=true")
-
-    return False, "; ".join(errors) if errors else "No LLM provider configured"
+    state = _PROVIDER_STATE
+    return state.active is not None, state.configured_message
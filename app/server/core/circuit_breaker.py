@@ -0,0 +1,73 @@
+"""
+Circuit breaker for LLM provider calls.
+After repeated failures a provider is skipped for a cooldown period instead
+of making every request wait on it, then a single trial call decides whether
+it is healthy again.
+"""
+
+import threading
+import time
+
+from core.llm_errors import ProviderDown
+
+
+class ProviderUnavailableError(ProviderDown):
+    """Raised when a provider is skipped because its circuit is open."""
+    pass
+
+
+class CircuitBreaker:
+    """
+    Tracks consecutive failures for one provider.
+
+    States:
+        closed    - calls are allowed
+        open      - calls are rejected until the cooldown elapses
+        half_open - cooldown elapsed; the next call is a trial
+    """
+
+    def __init__(self, failure_threshold: int = 5, cooldown_seconds: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._failures < self.failure_threshold:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.cooldown_seconds:
+                return "half_open"
+            return "open"
+
+    def allow(self) -> bool:
+        """
+        Return True if a call may be made now.
+        Once the cooldown has elapsed one trial call is let through and the
+        cooldown restarts, so concurrent callers don't all hit a sick provider.
+        """
+        with self._lock:
+            if self._failures < self.failure_threshold:
+                return True
+            now = time.monotonic()
+            if now - self._opened_at >= self.cooldown_seconds:
+                self._opened_at = now
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = 0.0
@@ -0,0 +1,286 @@
+"""
+Response caching for natural language to SQL generation.
+Keeps generated SQL keyed by provider, prompt version, schema fingerprint
+and query text so repeated questions skip the LLM round-trip, and can match
+paraphrased questions by embedding similarity. Entries can optionally be
+persisted to SQLite so they survive restarts and are shared between workers.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Bump when the prompt changes so previously cached SQL is not reused
+PROMPT_VERSION = "v4"
+
+CacheKey = Tuple[str, str, str, str]
+
+
+def schema_fingerprint(schema_info: Dict[str, Any]) -> str:
+    """
+    Return a stable SHA-256 hex digest of a database schema
+    """
+    payload = json.dumps(schema_info, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ExactMatchCache:
+    """
+    Thread-safe LRU cache of generated SQL keyed on the exact query text
+    """
+
+    def __init__(self, max_entries: int = 2048):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[CacheKey, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(provider: str, schema_fp: str, query_text: str) -> CacheKey:
+        return (PROMPT_VERSION, provider, schema_fp, query_text)
+
+    def get(self, key: CacheKey) -> Optional[str]:
+        with self._lock:
+            sql = self._entries.get(key)
+            if sql is not None:
+                self._entries.move_to_end(key)
+            return sql
+
+    def put(self, key: CacheKey, sql: str) -> None:
+        with self._lock:
+            self._entries[key] = sql
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SemanticCache:
+    """
+    Thread-safe cache of generated SQL matched by cosine similarity of
+    query embeddings, scoped per schema fingerprint
+    """
+
+    def __init__(self, threshold: float = 0.92, max_entries: int = 512,
+                 ttl_seconds: Optional[float] = None, max_schemas: int = 8):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_schemas = max_schemas
+        # schema_fp -> (unit vectors (N, D), sql strings, insert times)
+        self._entries: "OrderedDict[str, Tuple[np.ndarray, List[str], List[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(embedding: np.ndarray) -> Optional[np.ndarray]:
+        vec = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = float(np.linalg.norm(vec))
+        if norm == 0.0:
+            return None
+        return vec / norm
+
+    def lookup(self, schema_fp: str, embedding: np.ndarray) -> Optional[str]:
+        """
+        Return the SQL of the most similar cached query, if it clears the threshold
+        """
+        query_vec = self._normalize(embedding)
+        if query_vec is None:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(schema_fp)
+            if entry is None:
+                return None
+            vectors, sqls, added_at = entry
+            if vectors.shape[1] != query_vec.shape[0]:
+                return None
+
+            sims = vectors @ query_vec
+            if self.ttl_seconds is not None:
+                expired = np.asarray(added_at) < time.time() - self.ttl_seconds
+                sims[expired] = -1.0
+
+            best = int(np.argmax(sims))
+            if sims[best] >= self.threshold:
+                return sqls[best]
+            return None
+
+    def add(self, schema_fp: str, embedding: np.ndarray, sql: str) -> None:
+        query_vec = self._normalize(embedding)
+        if query_vec is None:
+            return
+
+        with self._lock:
+            entry = self._entries.get(schema_fp)
+            if entry is None or entry[0].shape[1] != query_vec.shape[0]:
+                vectors = query_vec[np.newaxis, :]
+                sqls, added_at = [sql], [time.time()]
+            else:
+                vectors = np.vstack([entry[0], query_vec])
+                sqls = entry[1] + [sql]
+                added_at = entry[2] + [time.time()]
+
+            # Drop the oldest entries once over capacity
+            overflow = len(sqls) - self.max_entries
+            if overflow > 0:
+                vectors, sqls, added_at = vectors[overflow:], sqls[overflow:], added_at[overflow:]
+
+            self._entries[schema_fp] = (vectors, sqls, added_at)
+            self._entries.move_to_end(schema_fp)
+            # Schemas change on every upload; forget the stale ones
+            while len(self._entries) > self.max_schemas:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return sum(len(sqls) for _, sqls, _ in self._entries.values())
+
+
+class SQLiteCacheStore:
+    """
+    Durable backing store for generated SQL and query embeddings.
+    One row per cache key, with an expiry time and a hit counter.
+    """
+
+    # Expired rows are purged every this many writes
+    PURGE_EVERY = 100
+
+    def __init__(self, path: str, ttl_seconds: float = 7 * 24 * 3600):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._conn: Optional[sqlite3.Connection] = None
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        # Opened on first use so an unused cache never creates the file
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    input_hash TEXT PRIMARY KEY,
+                    prompt_version TEXT NOT NULL,
+                    provider TEXT NOT NULL,
+                    schema_fp TEXT NOT NULL,
+                    query_text TEXT NOT NULL,
+                    sql TEXT NOT NULL,
+                    embedding BLOB,
+                    created_at REAL NOT NULL,
+                    expires_at REAL NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_schema_ver ON llm_cache(schema_fp, prompt_version)"
+            )
+            conn.execute("DELETE FROM llm_cache WHERE expires_at < ?", (time.time(),))
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def _hash_key(key: CacheKey) -> str:
+        return hashlib.sha256("\x1f".join(key).encode("utf-8")).hexdigest()
+
+    def get(self, key: CacheKey) -> Optional[str]:
+        input_hash = self._hash_key(key)
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT sql FROM llm_cache WHERE input_hash = ? AND expires_at >= ?",
+                (input_hash, time.time())
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            conn.execute("UPDATE llm_cache SET hits = hits + 1 WHERE input_hash = ?", (input_hash,))
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: CacheKey, sql: str, embedding: Optional[np.ndarray] = None) -> None:
+        prompt_version, provider, schema_fp, query_text = key
+        blob = None
+        if embedding is not None:
+            blob = np.asarray(embedding, dtype=np.float32).tobytes()
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO llm_cache
+                    (input_hash, prompt_version, provider, schema_fp, query_text,
+                     sql, embedding, created_at, expires_at, hits)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 0)
+                """,
+                (self._hash_key(key), prompt_version, provider, schema_fp, query_text,
+                 sql, blob, now, now + self.ttl_seconds)
+            )
+            self._writes += 1
+            if self._writes % self.PURGE_EVERY == 0:
+                conn.execute("DELETE FROM llm_cache WHERE expires_at < ?", (now,))
+
+    def load_embeddings(self, schema_fp: str) -> List[Tuple[np.ndarray, str]]:
+        """
+        Return stored (embedding, sql) pairs for a schema under the current prompt version
+        """
+        with self._lock:
+            rows = self._connect().execute(
+                """
+                SELECT embedding, sql FROM llm_cache
+                WHERE schema_fp = ? AND prompt_version = ? AND embedding IS NOT NULL
+                  AND expires_at >= ?
+                ORDER BY created_at
+                """,
+                (schema_fp, PROMPT_VERSION, time.time())
+            ).fetchall()
+        return [(np.frombuffer(blob, dtype=np.float32), sql) for blob, sql in rows]
+
+    def invalidate(self, prompt_version: Optional[str] = None) -> int:
+        """
+        Delete rows for one prompt version, or every row if none is given
+        """
+        with self._lock:
+            conn = self._connect()
+            if prompt_version is None:
+                cursor = conn.execute("DELETE FROM llm_cache")
+            else:
+                cursor = conn.execute("DELETE FROM llm_cache WHERE prompt_version = ?", (prompt_version,))
+            return cursor.rowcount
+
+    def purge_expired(self) -> int:
+        with self._lock:
+            cursor = self._connect().execute("DELETE FROM llm_cache WHERE expires_at < ?", (time.time(),))
+            return cursor.rowcount
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            entries, total_hits = self._connect().execute(
+                "SELECT COUNT(*), COALESCE(SUM(hits), 0) FROM llm_cache"
+            ).fetchone()
+        return {"entries": entries, "total_hits": total_hits, "hits": self.hits, "misses": self.misses}
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
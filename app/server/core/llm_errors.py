@@ -0,0 +1,35 @@
+"""
+Errors raised by LLM provider calls.
+Provider SDK exceptions are mapped onto these so the router can tell
+transient failures, which are worth trying another provider for, from
+permanent ones, which would fail the same way everywhere.
+"""
+
+
+class ProviderError(Exception):
+    """A provider call failed for a reason not covered by a subclass."""
+    pass
+
+
+class RateLimited(ProviderError):
+    """The provider rejected the call because of rate or quota limits."""
+    pass
+
+
+class ProviderDown(ProviderError):
+    """The provider could not be reached, timed out, had a server error or lacks the model."""
+    pass
+
+
+class AuthError(ProviderError):
+    """The API key is missing, invalid or lacks permission."""
+    pass
+
+
+class BadPrompt(ProviderError):
+    """The provider rejected the request itself (e.g. too long or malformed)."""
+    pass
+
+
+# Failures where another provider, or the same one later, may succeed
+RETRYABLE_ERRORS = (RateLimited, ProviderDown)
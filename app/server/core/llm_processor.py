@@ -1,140 +1,529 @@
 import os
+import re
 import json
-from typing import Dict, Any
-from openai import OpenAI
-from anthropic import Anthropic
+import asyncio
+import concurrent.futures
+import contextvars
+import difflib
+import functools
+import logging
+import threading
+import weakref
+from contextlib import contextmanager
+from collections import Counter, OrderedDict, deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+import httpx
+import numpy as np
+import openai
+import anthropic
+from openai import OpenAI, AsyncOpenAI
+from anthropic import Anthropic, AsyncAnthropic
 from core.data_models import QueryRequest
+from core.circuit_breaker import CircuitBreaker, ProviderUnavailableError
+from core.llm_errors import ProviderError, RateLimited, ProviderDown, AuthError, BadPrompt, RETRYABLE_ERRORS
+from core.sql_security import escape_identifier, SQLSecurityError
+from core.llm_cache import ExactMatchCache, SemanticCache, SQLiteCacheStore, schema_fingerprint
 
-def generate_sql_with_openai(query_text: str, schema_info: Dict[str, Any]) -> str:
-    """
-    Generate SQL query using OpenAI API
-    """
-    try:
-        # Get API key from environment
-        api_key = os.environ.get("OPENAI_API_KEY")
-        if not api_key:
-            raise ValueError("OPENAI_API_KEY environment variable not set")
-        
-        client = OpenAI(api_key=api_key)
-        
-        # Format schema for prompt
-        schema_description = format_schema_for_prompt(schema_info)
-        
-        # Create prompt
-        prompt = f"""Given the following database schema:
+logger = logging.getLogger(__name__)
+
+# Generated SQL for previously seen (provider, schema, query) combinations
+_sql_cache = ExactMatchCache(max_entries=2048)
+
+# Formatted schema text by schema fingerprint; schemas rarely change between queries
+_SCHEMA_PROMPT_CACHE_SIZE = 32
+_schema_prompt_cache: "OrderedDict[str, str]" = OrderedDict()
+_schema_prompt_lock = threading.Lock()
+# Pruned schema text by (schema fingerprint, question), so a repeated question
+# against a wide schema skips the fuzzy table matching
+_pruned_schema_cache = ExactMatchCache(max_entries=256)
+# (schema_info, fingerprint) for the request being generated. Hashing a schema
+# costs more than formatting it, so it is fingerprinted once per request and
+# prompt building looks the result up here instead of hashing again.
+_request_schema: contextvars.ContextVar = contextvars.ContextVar("_request_schema", default=None)
+
+# Generations in progress by cache key, so concurrent identical questions share one LLM call
+_inflight: Dict[Any, concurrent.futures.Future] = {}
+_inflight_lock = threading.Lock()
+_inflight_async: Dict[Any, asyncio.Future] = {}
+
+# Per-provider circuit breakers; a provider that keeps failing is skipped for a while
+_PROVIDER_NAMES = {"openai": "OpenAI", "anthropic": "Anthropic"}
+_breakers = {provider: CircuitBreaker(failure_threshold=5, cooldown_seconds=30.0) for provider in _PROVIDER_NAMES}
+
+# Delay before racing the backup provider against a slow primary. Off unless
+# LLM_HEDGE_MS is set, since every hedged request is paid for twice.
+_hedge_ms = os.environ.get("LLM_HEDGE_MS", "off").strip().lower()
+HEDGE_DELAY_SECONDS = None if _hedge_ms in ("", "0", "off") else float(_hedge_ms) / 1000
+
+# Optional SQLite store behind both caches so entries survive restarts
+_cache_db_path = os.environ.get("LLM_CACHE_DB_PATH")
+_persistent_cache = SQLiteCacheStore(
+    _cache_db_path,
+    ttl_seconds=float(os.environ.get("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600))),
+) if _cache_db_path else None
 
-{schema_description}
+# Questions that missed the cache are appended here (one JSON object per line)
+# so the next start can pre-generate the most common ones. The file is cut back
+# to the most recent _WARMUP_LOG_MAX_LINES lines whenever that many more have
+# been appended, so it never holds more than twice that.
+WARMUP_QUERIES_PATH = os.environ.get("LLM_WARMUP_QUERIES_PATH")
+_WARMUP_LOG_MAX_LINES = 10000
+_warmup_log_lock = threading.Lock()
+_warmup_log_appends = 0
+# Set while pre-warming so those generations aren't logged as new misses
+_prewarming = contextvars.ContextVar("_prewarming", default=False)
+# Schemas whose persisted embeddings are already in the semantic cache
+_loaded_schemas = set()
+_loaded_schemas_lock = threading.Lock()
 
-Convert this natural language query to SQL: "{query_text}"
+# Optional paraphrase matching; costs one embedding call per cache miss
+EMBEDDING_MODEL = "text-embedding-3-small"
+_semantic_cache = SemanticCache(
+    threshold=float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", "0.92")),
+    max_entries=int(os.environ.get("SEMANTIC_CACHE_MAX_ENTRIES", "512")),
+    ttl_seconds=float(os.environ["SEMANTIC_CACHE_TTL_SECONDS"])
+    if os.environ.get("SEMANTIC_CACHE_TTL_SECONDS") else None,
+)
+
+# Both providers are forced to answer through this tool, so the SQL arrives as
+# a JSON string field with no prose or markdown fences around it
+_EMIT_SQL_TOOL = "emit_sql"
+_EMIT_SQL_DESCRIPTION = "Return the SQLite query that answers the question"
+_EMIT_SQL_SCHEMA = {
+    "type": "object",
+    "properties": {"sql": {"type": "string", "description": "A single SQLite statement"}},
+    "required": ["sql"],
+}
+_OPENAI_SEED = 42
+
+# Schemas larger than this (estimated tokens) are pruned to the relevant tables
+SCHEMA_PROMPT_TOKEN_BUDGET = int(os.environ.get("SCHEMA_PROMPT_TOKEN_BUDGET", "1500"))
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+# Questions simple enough to answer without an LLM, mapped to SQL templates
+_RULE_BASED_PATTERNS = [
+    (
+        re.compile(r"^(?:show|list|display|get)(?: me)?(?: all)?(?: (?:rows|records) (?:in|from))?(?: the)? (?P<table>\w+)(?: table)?$", re.I),
+        "SELECT * FROM {table}",
+    ),
+    (
+        re.compile(r"^(?:count|how many)(?: (?:rows|records))?(?: (?:are )?in)?(?: the)? (?P<table>\w+)(?: table)?(?: are there)?$", re.I),
+        "SELECT COUNT(*) FROM {table}",
+    ),
+]
+
+# Prompt shared by both providers, split so everything that stays the same for
+# a given schema comes first and the user's question last. Providers cache a
+# repeated prompt prefix, so only the question is new work on each request.
+# Bound .format renders each part without rebuilding the text.
+_render_system_prompt = """You are a SQL expert. Convert natural language to SQL queries.
+
+Given the following database schema:
+
+{schema}
 
 Rules:
-- Return ONLY the SQL query, no explanations
+- Return ONLY the SQL query via the emit_sql tool, no explanations
 - Use proper SQLite syntax
 - Handle date/time queries appropriately (e.g., "last week" = date('now', '-7 days'))
 - Be careful with column names and table names
-- If the query is ambiguous, make reasonable assumptions
+- If the query is ambiguous, make reasonable assumptions""".format
 
-SQL Query:"""
-        
-        # Call OpenAI API
-        response = client.chat.completions.create(
-            model="gpt-4.1-mini",
-            messages=[
-                {"role": "system", "content": "You are a SQL expert. Convert natural language to SQL queries."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.1,
-            max_tokens=500
-        )
-        
-        sql = response.choices[0].message.content.strip()
-        
-        # Clean up the SQL (remove markdown if present)
-        if sql.startswith("```sql"):
-            sql = sql[6:]
-        if sql.startswith("```"):
-            sql = sql[3:]
-        if sql.endswith("```"):
-            sql = sql[:-3]
-        
-        return sql.strip()
-        
-    except Exception as e:
-        raise Exception(f"Error generating SQL with OpenAI: {str(e)}")
+_render_question = """Convert this natural language query to SQL: "{query}"
+
+SQL Query:""".format
+
+# SDK clients are built once per API key so their HTTP connection pools are reused
+_HTTP_LIMITS = httpx.Limits(max_keepalive_connections=20, max_connections=40)
+_HTTP_TIMEOUT = httpx.Timeout(30.0, connect=5.0)
+_clients: Dict[Any, Any] = {}
+_clients_lock = threading.Lock()
+
+# The async SDK clients share one HTTP pool per event loop (an httpx.AsyncClient
+# can only be used from the loop it was created on). It speaks HTTP/2, so
+# concurrent requests to a provider multiplex over one connection.
+_ASYNC_HTTP_LIMITS = httpx.Limits(max_keepalive_connections=40, max_connections=100)
+_ASYNC_HTTP_TIMEOUT = httpx.Timeout(30.0, connect=3.0)
+
+@dataclass
+class _LoopClients:
+    """The shared HTTP pool and the async SDK clients built on it, for one event loop."""
+    http_client: httpx.AsyncClient
+    sdk_clients: Dict[Any, Any]
+
+# Weakly keyed so a loop that is closed and discarded takes its clients with it
+_loop_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopClients]" = weakref.WeakKeyDictionary()
+
+def _new_sync_http_client() -> httpx.Client:
+    return httpx.Client(limits=_HTTP_LIMITS, timeout=_HTTP_TIMEOUT)
+
+def _get_client(client_class, api_key: str):
+    key = (client_class, api_key)
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                client = client_class(api_key=api_key, http_client=_new_sync_http_client())
+                _clients[key] = client
+    return client
+
+def _get_async_client(client_class, api_key: str):
+    # Must be called from a running event loop
+    loop = asyncio.get_running_loop()
+    key = (client_class, api_key)
+    with _clients_lock:
+        state = _loop_clients.get(loop)
+        if state is None or state.http_client.is_closed:
+            http_client = httpx.AsyncClient(
+                http2=True, limits=_ASYNC_HTTP_LIMITS, timeout=_ASYNC_HTTP_TIMEOUT
+            )
+            state = _LoopClients(http_client=http_client, sdk_clients={})
+            _loop_clients[loop] = state
+        client = state.sdk_clients.get(key)
+        if client is None:
+            client = client_class(api_key=api_key, http_client=state.http_client)
+            state.sdk_clients[key] = client
+    return client
+
+def get_openai_client(api_key: str) -> OpenAI:
+    """
+    Return the shared OpenAI client for this API key
+    """
+    return _get_client(OpenAI, api_key)
+
+def get_anthropic_client(api_key: str) -> Anthropic:
+    """
+    Return the shared Anthropic client for this API key
+    """
+    return _get_client(Anthropic, api_key)
+
+def get_async_openai_client(api_key: str) -> AsyncOpenAI:
+    """
+    Return the async OpenAI client for this API key on the running event loop
+    """
+    return _get_async_client(AsyncOpenAI, api_key)
+
+def get_async_anthropic_client(api_key: str) -> AsyncAnthropic:
+    """
+    Return the async Anthropic client for this API key on the running event loop
+    """
+    return _get_async_client(AsyncAnthropic, api_key)
+
+def reset_llm_clients() -> None:
+    """
+    Close and drop the shared SDK clients so the next call builds new ones
+    """
+    with _clients_lock:
+        clients = list(_clients.values())
+        _clients.clear()
+        loop_states = list(_loop_clients.items())
+        _loop_clients.clear()
+    for client in clients:
+        client.close()
+    for loop, state in loop_states:
+        _close_on_loop(loop, state.http_client)
+
+def _close_on_loop(loop: asyncio.AbstractEventLoop, http_client: httpx.AsyncClient) -> None:
+    # An async pool can only be closed on its own loop
+    if loop.is_closed():
+        # Its connections were torn down with the loop
+        return
+    if loop.is_running():
+        asyncio.run_coroutine_threadsafe(http_client.aclose(), loop)
+    else:
+        loop.run_until_complete(http_client.aclose())
+
+async def aclose_llm_clients() -> None:
+    """
+    Close the running loop's async HTTP pool and drop its SDK clients (call on shutdown)
+    """
+    with _clients_lock:
+        state = _loop_clients.pop(asyncio.get_running_loop(), None)
+    if state is not None:
+        await state.http_client.aclose()
+
+def generate_sql_with_openai(query_text: str, schema_info: Dict[str, Any]) -> str:
+    """
+    Generate SQL query using OpenAI API
+    """
+    return _call_provider("openai", query_text, schema_info)
 
 def generate_sql_with_anthropic(query_text: str, schema_info: Dict[str, Any]) -> str:
     """
     Generate SQL query using Anthropic API
     """
-    try:
-        # Get API key from environment
-        api_key = os.environ.get("ANTHROPIC_API_KEY")
-        if not api_key:
-            raise ValueError("ANTHROPIC_API_KEY environment variable not set")
-        
-        client = Anthropic(api_key=api_key)
-        
-        # Format schema for prompt
-        schema_description = format_schema_for_prompt(schema_info)
-        
-        # Create prompt
-        prompt = f"""Given the following database schema:
+    return _call_provider("anthropic", query_text, schema_info)
 
-{schema_description}
+async def generate_sql_with_openai_async(query_text: str, schema_info: Dict[str, Any]) -> str:
+    """
+    Generate SQL query using OpenAI API without blocking the event loop
+    """
+    return await _call_provider_async("openai", query_text, schema_info)
 
-Convert this natural language query to SQL: "{query_text}"
+async def generate_sql_with_anthropic_async(query_text: str, schema_info: Dict[str, Any]) -> str:
+    """
+    Generate SQL query using Anthropic API without blocking the event loop
+    """
+    return await _call_provider_async("anthropic", query_text, schema_info)
 
-Rules:
-- Return ONLY the SQL query, no explanations
-- Use proper SQLite syntax
-- Handle date/time queries appropriately (e.g., "last week" = date('now', '-7 days'))
-- Be careful with column names and table names
-- If the query is ambiguous, make reasonable assumptions
+def _call_provider(provider: str, query_text: str, schema_info: Dict[str, Any]) -> str:
+    adapter = _PROVIDERS[provider]
+    try:
+        client = adapter.get_client(_provider_api_key(adapter))
+        response = adapter.create(client)(**adapter.build_request(query_text, schema_info))
+        return adapter.extract_sql(response).strip()
+    except Exception as e:
+        raise _provider_error(provider, e) from e
 
-SQL Query:"""
-        
-        # Call Anthropic API
-        response = client.messages.create(
-            model="claude-3-haiku-20240307",
-            max_tokens=500,
-            temperature=0.1,
-            messages=[
-                {"role": "user", "content": prompt}
-            ]
-        )
-        
-        sql = response.content[0].text.strip()
-        
-        # Clean up the SQL (remove markdown if present)
-        if sql.startswith("```sql"):
-            sql = sql[6:]
-        if sql.startswith("```"):
-            sql = sql[3:]
-        if sql.endswith("```"):
-            sql = sql[:-3]
-        
-        return sql.strip()
-        
+async def _call_provider_async(provider: str, query_text: str, schema_info: Dict[str, Any]) -> str:
+    adapter = _PROVIDERS[provider]
+    try:
+        client = adapter.get_async_client(_provider_api_key(adapter))
+        if _prompt_is_cached(schema_info):
+            request = adapter.build_request(query_text, schema_info)
+        else:
+            # Formatting (and pruning) a new schema can take a while; keep the event loop free.
+            # to_thread carries the request's schema fingerprint over to the worker.
+            request = await asyncio.to_thread(adapter.build_request, query_text, schema_info)
+        response = await adapter.create(client)(**request)
+        return adapter.extract_sql(response).strip()
     except Exception as e:
-        raise Exception(f"Error generating SQL with Anthropic: {str(e)}")
+        raise _provider_error(provider, e) from e
+
+def _provider_api_key(adapter: "_ProviderAdapter") -> str:
+    # Get API key from environment
+    api_key = os.environ.get(adapter.api_key_env)
+    if not api_key:
+        raise AuthError(f"{adapter.api_key_env} environment variable not set")
+    return api_key
 
-def format_schema_for_prompt(schema_info: Dict[str, Any]) -> str:
+# SDK exceptions by the kind of failure they represent; anything else is a plain ProviderError
+_SDK_ERROR_KINDS = (
+    ((openai.RateLimitError, anthropic.RateLimitError), RateLimited),
+    # A 404 means this provider doesn't serve the configured model; the other one may
+    ((openai.APIConnectionError, anthropic.APIConnectionError,
+      openai.InternalServerError, anthropic.InternalServerError,
+      openai.NotFoundError, anthropic.NotFoundError), ProviderDown),
+    ((openai.AuthenticationError, anthropic.AuthenticationError,
+      openai.PermissionDeniedError, anthropic.PermissionDeniedError), AuthError),
+    ((openai.BadRequestError, anthropic.BadRequestError,
+      openai.UnprocessableEntityError, anthropic.UnprocessableEntityError), BadPrompt),
+)
+
+def _provider_error(provider: str, error: Exception) -> ProviderError:
+    """
+    Wrap an exception from a provider call in the matching ProviderError subclass
+    """
+    if isinstance(error, ProviderError):
+        error_class = type(error)
+    else:
+        error_class = next((kind for sdk_errors, kind in _SDK_ERROR_KINDS if isinstance(error, sdk_errors)), ProviderError)
+    return error_class(f"Error generating SQL with {_PROVIDER_NAMES[provider]}: {str(error)}")
+
+def _openai_request(query_text: str, schema_info: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Build chat completion arguments for an OpenAI SQL request
+    """
+    return {
+        "model": "gpt-4.1-mini",
+        "messages": [
+            {"role": "system", "content": _system_prompt(query_text, schema_info)},
+            {"role": "user", "content": _render_question(query=query_text)}
+        ],
+        # Greedy decoding with a fixed seed so a repeated prompt returns the same SQL
+        "temperature": 0.0,
+        "seed": _OPENAI_SEED,
+        "max_tokens": 500,
+        "tools": [{
+            "type": "function",
+            "function": {
+                "name": _EMIT_SQL_TOOL,
+                "description": _EMIT_SQL_DESCRIPTION,
+                "parameters": _EMIT_SQL_SCHEMA,
+            },
+        }],
+        "tool_choice": {"type": "function", "function": {"name": _EMIT_SQL_TOOL}},
+    }
+
+def _anthropic_request(query_text: str, schema_info: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Build message arguments for an Anthropic SQL request
+    """
+    return {
+        "model": "claude-3-haiku-20240307",
+        "max_tokens": 500,
+        # No seed parameter; temperature 0 is close to, but not guaranteed, deterministic
+        "temperature": 0.0,
+        "tools": [{
+            "name": _EMIT_SQL_TOOL,
+            "description": _EMIT_SQL_DESCRIPTION,
+            "input_schema": _EMIT_SQL_SCHEMA,
+        }],
+        "tool_choice": {"type": "tool", "name": _EMIT_SQL_TOOL},
+        # Anthropic only caches prefixes that are explicitly marked
+        "system": [
+            {
+                "type": "text",
+                "text": _system_prompt(query_text, schema_info),
+                "cache_control": {"type": "ephemeral"},
+            }
+        ],
+        "messages": [
+            {"role": "user", "content": _render_question(query=query_text)}
+        ],
+    }
+
+@dataclass(frozen=True)
+class _ProviderAdapter:
+    """SDK specifics for one provider; everything else is shared."""
+    api_key_env: str
+    get_client: Callable[[str], Any]
+    get_async_client: Callable[[str], Any]
+    build_request: Callable[[str, Dict[str, Any]], Dict[str, Any]]
+    # Picks the request method off a (sync or async) client
+    create: Callable[[Any], Callable[..., Any]]
+    extract_sql: Callable[[Any], str]
+
+_PROVIDERS = {
+    "openai": _ProviderAdapter(
+        api_key_env="OPENAI_API_KEY",
+        get_client=lambda api_key: get_openai_client(api_key),
+        get_async_client=lambda api_key: get_async_openai_client(api_key),
+        build_request=_openai_request,
+        create=lambda client: client.chat.completions.create,
+        extract_sql=lambda response: json.loads(response.choices[0].message.tool_calls[0].function.arguments)["sql"],
+    ),
+    "anthropic": _ProviderAdapter(
+        api_key_env="ANTHROPIC_API_KEY",
+        get_client=lambda api_key: get_anthropic_client(api_key),
+        get_async_client=lambda api_key: get_async_anthropic_client(api_key),
+        build_request=_anthropic_request,
+        create=lambda client: client.messages.create,
+        extract_sql=lambda response: next(block.input["sql"] for block in response.content if block.type == "tool_use"),
+    ),
+}
+
+@contextmanager
+def _using_schema_fingerprint(schema_info: Dict[str, Any], schema_fp: str) -> Iterator[None]:
+    token = _request_schema.set((schema_info, schema_fp))
+    try:
+        yield
+    finally:
+        _request_schema.reset(token)
+
+def _current_schema_fingerprint(schema_info: Dict[str, Any]) -> Optional[str]:
+    # Only valid for the exact schema object the request was fingerprinted with
+    current = _request_schema.get()
+    if current is not None and current[0] is schema_info:
+        return current[1]
+    return None
+
+def _system_prompt(query_text: str, schema_info: Dict[str, Any]) -> str:
+    schema_fp = _current_schema_fingerprint(schema_info)
+    full_schema = format_schema_for_prompt(schema_info, schema_fp)
+    if _estimate_tokens(full_schema) <= SCHEMA_PROMPT_TOKEN_BUDGET:
+        return _render_system_prompt(schema=full_schema)
+    
+    # Tradeoff: a pruned prompt depends on the question, so unlike a full-schema
+    # prompt it rarely shares a cached prefix with earlier requests. For schemas
+    # over budget, sending a fraction of the tokens uncached beats sending all
+    # of them with a cache hit.
+    pruned_key = (schema_fp, query_text) if schema_fp is not None else None
+    pruned_schema = _pruned_schema_cache.get(pruned_key) if pruned_key else None
+    if pruned_schema is None:
+        relevant = _select_relevant_tables(schema_info, query_text, SCHEMA_PROMPT_TOKEN_BUDGET, schema_fp)
+        pruned_schema = full_schema if relevant is schema_info else format_schema_for_prompt(relevant)
+        if pruned_key:
+            _pruned_schema_cache.put(pruned_key, pruned_schema)
+    return _render_system_prompt(schema=pruned_schema)
+
+def _prompt_is_cached(schema_info: Dict[str, Any]) -> bool:
+    # Cheap to build only if the schema text is memoized and needs no pruning.
+    # Without the request's fingerprint, finding out would mean hashing the schema.
+    schema_fp = _current_schema_fingerprint(schema_info)
+    if schema_fp is None:
+        return False
+    with _schema_prompt_lock:
+        formatted = _schema_prompt_cache.get(schema_fp)
+    return formatted is not None and _estimate_tokens(formatted) <= SCHEMA_PROMPT_TOKEN_BUDGET
+
+def _select_relevant_tables(schema_info: Dict[str, Any], query_text: str, budget_tokens: int,
+                            schema_fp: Optional[str] = None) -> Dict[str, Any]:
     """
-    Format database schema for LLM prompt
+    Trim a schema that is too large for the prompt budget down to the tables
+    the question mentions (by table or column name), then add the smallest
+    remaining tables while they fit. Schemas within budget, or where nothing
+    matches, are returned unchanged.
     """
-    lines = []
+    tables = schema_info.get('tables', {})
+    if _estimate_tokens(format_schema_for_prompt(schema_info, schema_fp)) <= budget_tokens:
+        return schema_info
     
-    for table_name, table_info in schema_info.get('tables', {}).items():
-        lines.append(f"Table: {table_name}")
-        lines.append("Columns:")
-        
-        for col_name, col_type in table_info['columns'].items():
-            lines.append(f"  - {col_name} ({col_type})")
-        
-        lines.append(f"Row count: {table_info['row_count']}")
-        lines.append("")
+    words = set(_WORD_RE.findall(query_text.lower()))
+    keep = {name for name, info in tables.items() if _table_mentioned(words, name, info['columns'])}
+    if not keep:
+        return schema_info
     
-    return "\n".join(lines)
+    used = sum(_estimate_tokens(_format_table_block(name, tables[name])) for name in keep)
+    for name in sorted((n for n in tables if n not in keep), key=lambda n: len(tables[n]['columns'])):
+        cost = _estimate_tokens(_format_table_block(name, tables[name]))
+        if used + cost > budget_tokens:
+            break
+        keep.add(name)
+        used += cost
+    
+    # Keep the original table order so the prompt stays stable
+    return {**schema_info, 'tables': {name: info for name, info in tables.items() if name in keep}}
+
+def _table_mentioned(words: set, table_name: str, columns: Dict[str, str]) -> bool:
+    for identifier in (table_name, *columns):
+        identifier = identifier.lower()
+        if identifier in words:
+            return True
+        # Match "customer" to customers, order_date to "order date", etc.
+        for part in identifier.split("_"):
+            if len(part) > 2 and difflib.get_close_matches(part, words, n=1, cutoff=0.8):
+                return True
+    return False
+
+def _estimate_tokens(text: str) -> int:
+    # Roughly four characters per token for English and identifiers
+    return len(text) // 4
+
+def format_schema_for_prompt(schema_info: Dict[str, Any], schema_fp: Optional[str] = None) -> str:
+    """
+    Format database schema for LLM prompt. Given the schema's fingerprint, the
+    text for a schema seen before is reused; without one the schema is simply
+    formatted, since fingerprinting it would cost more than formatting.
+    """
+    if schema_fp is None:
+        return _format_schema_impl(schema_info)
+    with _schema_prompt_lock:
+        formatted = _schema_prompt_cache.get(schema_fp)
+        if formatted is not None:
+            _schema_prompt_cache.move_to_end(schema_fp)
+            return formatted
+
+    formatted = _format_schema_impl(schema_info)
+
+    with _schema_prompt_lock:
+        _schema_prompt_cache[schema_fp] = formatted
+        while len(_schema_prompt_cache) > _SCHEMA_PROMPT_CACHE_SIZE:
+            _schema_prompt_cache.popitem(last=False)
+    return formatted
+
+def _format_schema_impl(schema_info: Dict[str, Any]) -> str:
+    blocks = [_format_table_block(name, info) for name, info in schema_info.get('tables', {}).items()]
+    if not blocks:
+        return ""
+    # Each table block is followed by a blank line
+    return "\n\n".join(blocks) + "\n"
+
+def _format_table_block(table_name: str, table_info: Dict[str, Any]) -> str:
+    columns = "".join(f"  - {col_name} ({col_type})\n" for col_name, col_type in table_info['columns'].items())
+    return f"Table: {table_name}\nColumns:\n{columns}Row count: {table_info['row_count']}"
 
 def generate_sql(request: QueryRequest, schema_info: Dict[str, Any]) -> str:
     """
@@ -145,31 +534,491 @@ def generate_sql(request: QueryRequest, schema_info: Dict[str, Any]) -> str:
     2) OPENAI_ENABLED=true AND OPENAI_API_KEY exists -> use OpenAI
     3) Fall back to request.llm_provider preference
     4) Error if no provider is configured
+
+    If the chosen provider is rate limited or down, or has failed repeatedly
+    and is in its cooldown, the next configured provider is tried. Other
+    errors (bad key, rejected prompt) are raised straight away.
+    """
+    # Trivial questions are answered without an LLM
+    sql = _try_rule_based(request.query, schema_info)
+    if sql is not None:
+        return sql
+    
+    providers = _route_providers(request)
+    
+    schema_fp = schema_fingerprint(schema_info)
+    key = ExactMatchCache.make_key(providers[0], schema_fp, request.query)
+    sql = _lookup_exact(key)
+    if sql is not None:
+        return sql
+    
+    embedding = None
+    if _semantic_cache_enabled():
+        embedding = embed_query(request.query)
+        sql = _semantic_lookup(key, schema_fp, embedding)
+        if sql is not None:
+            return sql
+    
+    def generate_and_store() -> str:
+        # A leader that finished between our lookup and taking the key has already stored it
+        sql = _sql_cache.get(key)
+        if sql is not None:
+            return sql
+        
+        # Fall back to the next provider on transient failures or an open circuit
+        errors = []
+        with _using_schema_fingerprint(schema_info, schema_fp):
+            for candidate in providers:
+                try:
+                    sql = _generate_with_provider(candidate, request.query, schema_info)
+                    break
+                except RETRYABLE_ERRORS as e:
+                    errors.append(e)
+            else:
+                raise _primary_error(errors)
+        
+        _store_sql(key, schema_fp, embedding, sql)
+        _persist_sql(key, embedding, sql, request.query)
+        return sql
+    
+    return _single_flight(key, generate_and_store)
+
+async def generate_sql_async(request: QueryRequest, schema_info: Dict[str, Any]) -> str:
+    """
+    Async variant of generate_sql with the same provider priority.
+    When both providers are configured, LLM_HEDGE_MS is set and the first
+    is slow or fails transiently, the other is raced against it and the
+    first answer wins.
+    """
+    sql = _try_rule_based(request.query, schema_info)
+    if sql is not None:
+        return sql
+    
+    providers = _route_providers(request)
+    
+    schema_fp = schema_fingerprint(schema_info)
+    key = ExactMatchCache.make_key(providers[0], schema_fp, request.query)
+    # SQLite and file I/O run in worker threads so they don't stall other requests
+    sql = _sql_cache.get(key)
+    if sql is None and _persistent_cache is not None:
+        sql = await asyncio.to_thread(_lookup_persisted, key)
+    if sql is not None:
+        return sql
+    
+    embedding = None
+    if _semantic_cache_enabled():
+        embedding = await asyncio.to_thread(embed_query, request.query)
+        sql = await asyncio.to_thread(_semantic_lookup, key, schema_fp, embedding)
+        if sql is not None:
+            return sql
+    
+    async def generate_and_store() -> str:
+        # A leader that finished between our lookup and taking the key has already stored it
+        sql = _sql_cache.get(key)
+        if sql is not None:
+            return sql
+        
+        with _using_schema_fingerprint(schema_info, schema_fp):
+            sql = await _generate_sql_hedged(providers, request.query, schema_info)
+        _store_sql(key, schema_fp, embedding, sql)
+        await asyncio.to_thread(_persist_sql, key, embedding, sql, request.query)
+        return sql
+    
+    return await _single_flight_async(key, generate_and_store)
+
+def _single_flight(key, generate: Callable[[], str]) -> str:
+    """
+    Run generate() for a key unless another thread is already generating it,
+    in which case wait for and share that result. generate() should re-check
+    the cache first, since a previous owner may have finished just before.
+    """
+    with _inflight_lock:
+        future = _inflight.get(key)
+        owner = future is None
+        if owner:
+            future = concurrent.futures.Future()
+            _inflight[key] = future
+    
+    if not owner:
+        return future.result()
+    
+    try:
+        sql = generate()
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    else:
+        future.set_result(sql)
+        return sql
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+
+async def _single_flight_async(key, generate: Callable[[], Awaitable[str]]) -> str:
+    """
+    Async single-flight: concurrent requests for the same key await one task
+    """
+    task = _inflight_async.get(key)
+    # Tasks left over from another (e.g. closed) event loop can't be awaited here
+    if task is None or task.get_loop() is not asyncio.get_running_loop():
+        task = asyncio.ensure_future(generate())
+        _inflight_async[key] = task
+        
+        def forget(done_task: asyncio.Future) -> None:
+            if _inflight_async.get(key) is done_task:
+                del _inflight_async[key]
+        
+        task.add_done_callback(forget)
+    
+    # One caller disconnecting must not cancel the generation for the others
+    return await asyncio.shield(task)
+
+def _try_rule_based(query_text: str, schema_info: Dict[str, Any]) -> Optional[str]:
+    """
+    Translate questions like "show all users" or "how many orders" directly,
+    if they name an existing table. Returns None for anything else.
+    """
+    question = query_text.strip().rstrip("?.!").strip()
+    for pattern, template in _RULE_BASED_PATTERNS:
+        match = pattern.match(question)
+        if match is None:
+            continue
+        
+        requested = match.group("table").lower()
+        table_name = next((name for name in schema_info.get('tables', {}) if name.lower() == requested), None)
+        if table_name is None:
+            return None
+        try:
+            return template.format(table=escape_identifier(table_name))
+        except SQLSecurityError:
+            return None
+    return None
+
+@dataclass(frozen=True)
+class RoutingPolicy:
+    """Provider routing settings resolved from the environment."""
+    anthropic_enabled: bool
+    openai_enabled: bool
+    have_anthropic_key: bool
+    have_openai_key: bool
+    # Enabled providers with keys, highest priority first
+    providers_in_priority: Tuple[str, ...]
+
+@functools.lru_cache(maxsize=1)
+def get_routing_policy() -> RoutingPolicy:
+    """
+    Read provider flags and keys once; the environment doesn't change while
+    the server runs. Call get_routing_policy.cache_clear() after changing it.
     """
     # Read provider enable flags (default Anthropic=true for backward compatibility)
     anthropic_enabled = os.environ.get("ANTHROPIC_ENABLED", "true").lower() == "true"
     openai_enabled = os.environ.get("OPENAI_ENABLED", "true").lower() == "true"
 
     # Check API keys
-    openai_key = os.environ.get("OPENAI_API_KEY")
-    anthropic_key = os.environ.get("ANTHROPIC_API_KEY")
+    have_openai_key = bool(os.environ.get("OPENAI_API_KEY"))
+    have_anthropic_key = bool(os.environ.get("ANTHROPIC_API_KEY"))
+
+    providers = []
 
     # Priority 1: Anthropic if enabled and key exists
-    if anthropic_enabled and anthropic_key:
-        return generate_sql_with_anthropic(request.query, schema_info)
+    if anthropic_enabled and have_anthropic_key:
+        providers.append("anthropic")
 
     # Priority 2: OpenAI if enabled and key exists
-    if openai_enabled and openai_key:
-        return generate_sql_with_openai(request.query, schema_info)
+    if openai_enabled and have_openai_key:
+        providers.append("openai")
+
+    return RoutingPolicy(
+        anthropic_enabled=anthropic_enabled,
+        openai_enabled=openai_enabled,
+        have_anthropic_key=have_anthropic_key,
+        have_openai_key=have_openai_key,
+        providers_in_priority=tuple(providers),
+    )
+
+def _route_providers(request: QueryRequest) -> List[str]:
+    """
+    Return the usable providers in priority order; the first one is the primary
+    """
+    policy = get_routing_policy()
+    if policy.providers_in_priority:
+        return list(policy.providers_in_priority)
 
     # Priority 3: Fall back to request preference if key exists
-    if request.llm_provider == "openai" and openai_key:
-        return generate_sql_with_openai(request.query, schema_info)
-    elif request.llm_provider == "anthropic" and anthropic_key:
-        return generate_sql_with_anthropic(request.query, schema_info)
+    if request.llm_provider == "openai" and policy.have_openai_key:
+        return ["openai"]
+    elif request.llm_provider == "anthropic" and policy.have_anthropic_key:
+        return ["anthropic"]
 
     # Priority 4: Error if no provider is configured
     raise ValueError(
         "No LLM provider configured. Set ANTHROPIC_ENABLED=true with ANTHROPIC_API_KEY "
         "or OPENAI_ENABLED=true with OPENAI_API_KEY in your environment."
-    )
\ No newline at end of file
+    )
+
+async def _generate_sql_hedged(providers: List[str], query_text: str, schema_info: Dict[str, Any]) -> str:
+    """
+    Ask the primary provider, starting the backup if the primary hasn't
+    answered within the hedge delay or has already failed transiently.
+    A permanent error from the primary is raised immediately.
+    """
+    primary = asyncio.create_task(_generate_with_provider_async(providers[0], query_text, schema_info))
+    if len(providers) < 2 or HEDGE_DELAY_SECONDS is None:
+        return await primary
+
+    backup = None
+    try:
+        done, _ = await asyncio.wait({primary}, timeout=HEDGE_DELAY_SECONDS)
+        if primary in done:
+            _raise_if_permanent(primary)
+            if primary.exception() is None:
+                return primary.result()
+
+        backup = asyncio.create_task(_generate_with_provider_async(providers[1], query_text, schema_info))
+        pending = {task for task in (primary, backup) if not task.done()}
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task is primary:
+                    _raise_if_permanent(primary)
+                if task.exception() is None:
+                    return task.result()
+
+        # Both providers failed
+        raise _primary_error([primary.exception(), backup.exception()])
+    finally:
+        for task in (primary, backup):
+            if task is not None and not task.done():
+                task.cancel()
+
+def _raise_if_permanent(task: asyncio.Future) -> None:
+    error = task.exception()
+    if error is not None and not isinstance(error, RETRYABLE_ERRORS):
+        raise error
+
+def _generate_with_provider(provider: str, query_text: str, schema_info: Dict[str, Any]) -> str:
+    breaker = _check_breaker(provider)
+    try:
+        if provider == "anthropic":
+            sql = generate_sql_with_anthropic(query_text, schema_info)
+        else:
+            sql = generate_sql_with_openai(query_text, schema_info)
+    except RETRYABLE_ERRORS:
+        # Only outages count against the circuit; a bad key or prompt says nothing about availability
+        breaker.record_failure()
+        raise
+    breaker.record_success()
+    return sql
+
+async def _generate_with_provider_async(provider: str, query_text: str, schema_info: Dict[str, Any]) -> str:
+    breaker = _check_breaker(provider)
+    try:
+        if provider == "anthropic":
+            sql = await generate_sql_with_anthropic_async(query_text, schema_info)
+        else:
+            sql = await generate_sql_with_openai_async(query_text, schema_info)
+    except RETRYABLE_ERRORS:
+        # A hedged call that gets cancelled is neither a success nor a failure
+        breaker.record_failure()
+        raise
+    breaker.record_success()
+    return sql
+
+def _check_breaker(provider: str) -> CircuitBreaker:
+    breaker = _breakers[provider]
+    if not breaker.allow():
+        raise ProviderUnavailableError(
+            f"{_PROVIDER_NAMES[provider]} is temporarily unavailable after repeated failures"
+        )
+    return breaker
+
+def _primary_error(errors: List[Exception]) -> Exception:
+    """
+    Pick the error to report when every provider failed, preferring a real
+    provider error over a skipped one
+    """
+    for error in errors:
+        if not isinstance(error, ProviderUnavailableError):
+            return error
+    return errors[0]
+
+def reset_circuit_breakers() -> None:
+    """
+    Close all provider circuits (e.g. after fixing credentials or in tests)
+    """
+    for breaker in _breakers.values():
+        breaker.reset()
+
+def _semantic_cache_enabled() -> bool:
+    return os.environ.get("SEMANTIC_CACHE_ENABLED", "false").lower() == "true"
+
+def _lookup_exact(key) -> Optional[str]:
+    """
+    Return SQL cached for exactly this key, in memory or in the persistent store
+    """
+    sql = _sql_cache.get(key)
+    if sql is None and _persistent_cache is not None:
+        sql = _lookup_persisted(key)
+    return sql
+
+def _lookup_persisted(key) -> Optional[str]:
+    sql = _persistent_cache.get(key)
+    if sql is not None:
+        _sql_cache.put(key, sql)
+    return sql
+
+def _semantic_lookup(key, schema_fp: str, embedding: Optional[np.ndarray]) -> Optional[str]:
+    """
+    Return SQL cached for a paraphrase of this query, promoting it to the exact cache
+    """
+    if embedding is None:
+        return None
+    _load_persisted_embeddings(schema_fp)
+    sql = _semantic_cache.lookup(schema_fp, embedding)
+    if sql is not None:
+        _sql_cache.put(key, sql)
+    return sql
+
+def _load_persisted_embeddings(schema_fp: str) -> None:
+    """
+    Seed the in-memory semantic cache from the persistent store, once per schema
+    """
+    if _persistent_cache is None:
+        return
+    with _loaded_schemas_lock:
+        if schema_fp in _loaded_schemas:
+            return
+        _loaded_schemas.add(schema_fp)
+    for embedding, sql in _persistent_cache.load_embeddings(schema_fp):
+        _semantic_cache.add(schema_fp, embedding, sql)
+
+def _store_sql(key, schema_fp: str, embedding: Optional[np.ndarray], sql: str) -> None:
+    _sql_cache.put(key, sql)
+    if embedding is not None:
+        _semantic_cache.add(schema_fp, embedding, sql)
+
+def _persist_sql(key, embedding: Optional[np.ndarray], sql: str, query_text: str) -> None:
+    # Disk writes, kept apart from _store_sql so the async path can run them in a thread
+    if _persistent_cache is not None:
+        _persistent_cache.put(key, sql, embedding)
+    _record_warmup_query(query_text)
+
+def _record_warmup_query(query_text: str) -> None:
+    global _warmup_log_appends
+    if WARMUP_QUERIES_PATH is None or _prewarming.get():
+        return
+    line = json.dumps({"query": query_text}) + "\n"
+    try:
+        with _warmup_log_lock:
+            with open(WARMUP_QUERIES_PATH, "a", encoding="utf-8") as f:
+                f.write(line)
+            _warmup_log_appends += 1
+            if _warmup_log_appends >= _WARMUP_LOG_MAX_LINES:
+                _compact_warmup_log()
+                _warmup_log_appends = 0
+    except OSError as e:
+        logger.warning(f"Could not record warmup query: {e}")
+
+def _compact_warmup_log() -> List[str]:
+    """
+    Rewrite the warmup log with only its most recent lines, returning them.
+    Called with _warmup_log_lock held.
+    """
+    lines = deque(maxlen=_WARMUP_LOG_MAX_LINES)
+    total = 0
+    with open(WARMUP_QUERIES_PATH, encoding="utf-8") as f:
+        for line in f:
+            lines.append(line)
+            total += 1
+    if total > _WARMUP_LOG_MAX_LINES:
+        tmp_path = WARMUP_QUERIES_PATH + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.writelines(lines)
+        os.replace(tmp_path, WARMUP_QUERIES_PATH)
+    return list(lines)
+
+def load_warmup_queries(limit: int = 20) -> List[str]:
+    """
+    Return the most frequently logged cache-miss questions, most common first
+    """
+    if WARMUP_QUERIES_PATH is None:
+        return []
+    try:
+        # Only recent history counts; older lines are dropped from the file too
+        with _warmup_log_lock:
+            lines = _compact_warmup_log()
+    except FileNotFoundError:
+        return []
+    
+    counts = Counter()
+    for line in lines:
+        try:
+            counts[json.loads(line)["query"]] += 1
+        except (ValueError, KeyError, TypeError):
+            continue
+    return [query for query, _ in counts.most_common(limit)]
+
+async def prewarm_sql_cache(queries: List[str], schema_info: Dict[str, Any], concurrency: int = 4) -> int:
+    """
+    Generate SQL for the given questions so the caches hold it before real
+    traffic asks. Failures are logged and skipped. Returns how many succeeded.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    warmed = 0
+    
+    async def warm(query_text: str) -> None:
+        nonlocal warmed
+        async with semaphore:
+            try:
+                await generate_sql_async(QueryRequest(query=query_text), schema_info)
+                warmed += 1
+            except Exception as e:
+                logger.warning(f"Prewarm failed for {query_text!r}: {e}")
+    
+    token = _prewarming.set(True)
+    try:
+        await asyncio.gather(*(warm(query_text) for query_text in queries))
+    finally:
+        _prewarming.reset(token)
+    logger.info(f"Prewarmed SQL cache with {warmed} of {len(queries)} common queries")
+    return warmed
+
+def embed_query(query_text: str) -> Optional[np.ndarray]:
+    """
+    Embed a natural language query for the semantic cache.
+    Returns None if embeddings are unavailable, so lookups fall through to the LLM.
+    """
+    api_key = os.environ.get("OPENAI_API_KEY")
+    if not api_key:
+        return None
+
+    try:
+        client = get_openai_client(api_key)
+        response = client.embeddings.create(model=EMBEDDING_MODEL, input=query_text)
+        return np.asarray(response.data[0].embedding, dtype=np.float32)
+    except Exception as e:
+        logger.warning(f"[WARNING] Query embedding failed, skipping semantic cache: {str(e)}")
+        return None
+
+def clear_sql_cache() -> None:
+    """
+    Drop all in-memory cached SQL (e.g. after the schema changes or in tests).
+    The persistent store is left alone; see invalidate_cache.
+    """
+    _sql_cache.clear()
+    _semantic_cache.clear()
+    _pruned_schema_cache.clear()
+    with _schema_prompt_lock:
+        _schema_prompt_cache.clear()
+    with _loaded_schemas_lock:
+        _loaded_schemas.clear()
+
+def invalidate_cache(prompt_version: Optional[str] = None) -> int:
+    """
+    Delete persisted SQL for a prompt version (all versions if None) and clear
+    the in-memory caches. Returns the number of persisted rows removed.
+    """
+    clear_sql_cache()
+    if _persistent_cache is None:
+        return 0
+    return _persistent_cache.invalidate(prompt_version)
@@ -1,6 +1,8 @@
 from fastapi import FastAPI, File, UploadFile, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from datetime import datetime
+from contextlib import asynccontextmanager
+import asyncio
 import os
 import sqlite3
 import traceback
@@ -38,7 +40,7 @@ from core.data_models import (
 
 # Import core modules (to be implemented)
 from core.file_processor import convert_csv_to_sqlite, convert_json_to_sqlite
-from core.llm_processor import generate_sql
+from core.llm_processor import generate_sql_async, aclose_llm_clients, load_warmup_queries, prewarm_sql_cache
 from core.sql_processor import execute_sql_safely, get_database_schema
 from core.insights import generate_insights
 from core.sql_security import (
@@ -48,10 +50,38 @@ from core.sql_security import (
     SQLSecurityError
 )
 
+async def prewarm_common_queries():
+    """Generate SQL for historically common questions so their first request hits the cache"""
+    try:
+        queries = await asyncio.to_thread(load_warmup_queries)
+        if not queries:
+            return
+        schema_info = await asyncio.to_thread(get_database_schema)
+        if not schema_info.get('tables'):
+            return
+        logger.info(f"[INFO] Prewarming SQL cache with {len(queries)} common queries")
+        await prewarm_sql_cache(queries, schema_info)
+    except Exception as e:
+        logger.error(f"[ERROR] SQL cache prewarm failed: {str(e)}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm the cache in the background; the server accepts requests meanwhile
+    prewarm_task = None
+    if os.environ.get("PREWARM_DISABLED") != "1":
+        prewarm_task = asyncio.create_task(prewarm_common_queries())
+    yield
+    if prewarm_task is not None:
+        prewarm_task.cancel()
+        await asyncio.gather(prewarm_task, return_exceptions=True)
+    # Close pooled LLM provider connections on shutdown
+    await aclose_llm_clients()
+
 app = FastAPI(
     title="Natural Language SQL Interface",
     description="Convert natural language to SQL queries",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS configuration for frontend
@@ -116,7 +146,7 @@ async def process_natural_language_query(request: QueryRequest) -> QueryResponse
         schema_info = get_database_schema()
         
         # Generate SQL using routing logic
-        sql = generate_sql(request, schema_info)
+        sql = await generate_sql_async(request, schema_info)
         
         # Execute SQL query
         start_time = datetime.now()
@@ -0,0 +1,69 @@
+from unittest.mock import patch
+from core.circuit_breaker import CircuitBreaker
+
+
+class TestCircuitBreaker:
+    
+    def test_starts_closed(self):
+        breaker = CircuitBreaker()
+        
+        assert breaker.state == "closed"
+        assert breaker.allow()
+    
+    def test_opens_after_threshold(self):
+        breaker = CircuitBreaker(failure_threshold=3, cooldown_seconds=30)
+        
+        for _ in range(2):
+            breaker.record_failure()
+        assert breaker.allow()
+        
+        breaker.record_failure()
+        assert breaker.state == "open"
+        assert not breaker.allow()
+    
+    def test_success_resets_failures(self):
+        breaker = CircuitBreaker(failure_threshold=2)
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        
+        assert breaker.state == "closed"
+    
+    @patch('core.circuit_breaker.time.monotonic')
+    def test_half_open_allows_single_trial(self, mock_monotonic):
+        mock_monotonic.return_value = 100.0
+        breaker = CircuitBreaker(failure_threshold=1, cooldown_seconds=30)
+        breaker.record_failure()
+        assert not breaker.allow()
+        
+        mock_monotonic.return_value = 131.0
+        assert breaker.state == "half_open"
+        assert breaker.allow()
+        # Only one trial per cooldown window
+        assert not breaker.allow()
+    
+    @patch('core.circuit_breaker.time.monotonic')
+    def test_trial_success_closes(self, mock_monotonic):
+        mock_monotonic.return_value = 100.0
+        breaker = CircuitBreaker(failure_threshold=1, cooldown_seconds=30)
+        breaker.record_failure()
+        
+        mock_monotonic.return_value = 131.0
+        assert breaker.allow()
+        breaker.record_success()
+        
+        assert breaker.state == "closed"
+        assert breaker.allow()
+    
+    @patch('core.circuit_breaker.time.monotonic')
+    def test_trial_failure_reopens(self, mock_monotonic):
+        mock_monotonic.return_value = 100.0
+        breaker = CircuitBreaker(failure_threshold=1, cooldown_seconds=30)
+        breaker.record_failure()
+        
+        mock_monotonic.return_value = 131.0
+        assert breaker.allow()
+        breaker.record_failure()
+        
+        assert breaker.state == "open"
+        assert not breaker.allow()
@@ -0,0 +1,175 @@
+import pytest
+import numpy as np
+from unittest.mock import patch
+from core.llm_cache import ExactMatchCache, SemanticCache, SQLiteCacheStore, schema_fingerprint, PROMPT_VERSION
+
+
+class TestExactMatchCache:
+    
+    def test_get_returns_stored_sql(self):
+        cache = ExactMatchCache()
+        key = ExactMatchCache.make_key("openai", "fp", "Show all users")
+        
+        assert cache.get(key) is None
+        cache.put(key, "SELECT * FROM users")
+        assert cache.get(key) == "SELECT * FROM users"
+    
+    def test_key_includes_prompt_version_and_provider(self):
+        key = ExactMatchCache.make_key("anthropic", "fp", "Show all users")
+        
+        assert key[0] == PROMPT_VERSION
+        assert key != ExactMatchCache.make_key("openai", "fp", "Show all users")
+    
+    def test_evicts_least_recently_used(self):
+        cache = ExactMatchCache(max_entries=2)
+        a = ExactMatchCache.make_key("openai", "fp", "a")
+        b = ExactMatchCache.make_key("openai", "fp", "b")
+        c = ExactMatchCache.make_key("openai", "fp", "c")
+        
+        cache.put(a, "SELECT 1")
+        cache.put(b, "SELECT 2")
+        cache.get(a)  # a is now most recently used
+        cache.put(c, "SELECT 3")
+        
+        assert len(cache) == 2
+        assert cache.get(a) == "SELECT 1"
+        assert cache.get(b) is None
+        assert cache.get(c) == "SELECT 3"
+    
+    def test_clear(self):
+        cache = ExactMatchCache()
+        cache.put(ExactMatchCache.make_key("openai", "fp", "a"), "SELECT 1")
+        cache.clear()
+        
+        assert len(cache) == 0
+
+
+class TestSchemaFingerprint:
+    
+    def test_independent_of_key_order(self):
+        schema_a = {'tables': {'users': {'columns': {'id': 'INTEGER', 'name': 'TEXT'}, 'row_count': 1}}}
+        schema_b = {'tables': {'users': {'row_count': 1, 'columns': {'name': 'TEXT', 'id': 'INTEGER'}}}}
+        
+        assert schema_fingerprint(schema_a) == schema_fingerprint(schema_b)
+    
+    def test_changes_with_schema(self):
+        schema_a = {'tables': {'users': {'columns': {'id': 'INTEGER'}, 'row_count': 1}}}
+        schema_b = {'tables': {'users': {'columns': {'id': 'TEXT'}, 'row_count': 1}}}
+        
+        assert schema_fingerprint(schema_a) != schema_fingerprint(schema_b)
+
+
+class TestSemanticCache:
+    
+    def test_similar_query_hits(self):
+        cache = SemanticCache(threshold=0.9)
+        cache.add("fp", np.array([1.0, 0.0, 0.0]), "SELECT * FROM sales")
+        
+        # Cosine similarity ~0.995
+        assert cache.lookup("fp", np.array([1.0, 0.1, 0.0])) == "SELECT * FROM sales"
+    
+    def test_dissimilar_query_misses(self):
+        cache = SemanticCache(threshold=0.9)
+        cache.add("fp", np.array([1.0, 0.0, 0.0]), "SELECT * FROM sales")
+        
+        assert cache.lookup("fp", np.array([0.0, 1.0, 0.0])) is None
+    
+    def test_scoped_by_schema(self):
+        cache = SemanticCache(threshold=0.9)
+        cache.add("fp-a", np.array([1.0, 0.0]), "SELECT 1")
+        
+        assert cache.lookup("fp-b", np.array([1.0, 0.0])) is None
+    
+    def test_returns_best_match(self):
+        cache = SemanticCache(threshold=0.5)
+        cache.add("fp", np.array([1.0, 0.0]), "SELECT 1")
+        cache.add("fp", np.array([0.0, 1.0]), "SELECT 2")
+        
+        assert cache.lookup("fp", np.array([0.2, 1.0])) == "SELECT 2"
+    
+    def test_expired_entries_ignored(self):
+        cache = SemanticCache(threshold=0.9, ttl_seconds=-1)
+        cache.add("fp", np.array([1.0, 0.0]), "SELECT 1")
+        
+        assert cache.lookup("fp", np.array([1.0, 0.0])) is None
+    
+    def test_max_entries_drops_oldest(self):
+        cache = SemanticCache(threshold=0.99, max_entries=2)
+        cache.add("fp", np.array([1.0, 0.0, 0.0]), "SELECT 1")
+        cache.add("fp", np.array([0.0, 1.0, 0.0]), "SELECT 2")
+        cache.add("fp", np.array([0.0, 0.0, 1.0]), "SELECT 3")
+        
+        assert len(cache) == 2
+        assert cache.lookup("fp", np.array([1.0, 0.0, 0.0])) is None
+        assert cache.lookup("fp", np.array([0.0, 0.0, 1.0])) == "SELECT 3"
+
+
+@pytest.fixture
+def store(tmp_path):
+    """SQLite cache store in a temporary directory"""
+    cache_store = SQLiteCacheStore(str(tmp_path / "cache" / "llm_cache.db"))
+    yield cache_store
+    cache_store.close()
+
+
+class TestSQLiteCacheStore:
+    
+    def test_put_and_get(self, store):
+        key = ExactMatchCache.make_key("openai", "fp", "Show all users")
+        
+        assert store.get(key) is None
+        store.put(key, "SELECT * FROM users")
+        assert store.get(key) == "SELECT * FROM users"
+    
+    def test_persists_across_instances(self, store):
+        key = ExactMatchCache.make_key("openai", "fp", "Show all users")
+        store.put(key, "SELECT * FROM users")
+        store.close()
+        
+        reopened = SQLiteCacheStore(store.path)
+        assert reopened.get(key) == "SELECT * FROM users"
+        reopened.close()
+    
+    def test_hit_and_miss_counters(self, store):
+        key = ExactMatchCache.make_key("openai", "fp", "q")
+        store.get(key)
+        store.put(key, "SELECT 1")
+        store.get(key)
+        store.get(key)
+        
+        stats = store.stats()
+        assert stats["entries"] == 1
+        assert stats["total_hits"] == 2
+        assert stats["hits"] == 2
+        assert stats["misses"] == 1
+    
+    def test_expired_rows_not_returned(self, store):
+        key = ExactMatchCache.make_key("openai", "fp", "q")
+        store.put(key, "SELECT 1")
+        
+        with patch('core.llm_cache.time.time', return_value=10 ** 12):
+            assert store.get(key) is None
+            assert store.purge_expired() == 1
+    
+    def test_embeddings_round_trip(self, store):
+        key = ExactMatchCache.make_key("openai", "fp", "sales last week")
+        store.put(key, "SELECT * FROM sales", np.array([0.6, 0.8]))
+        store.put(ExactMatchCache.make_key("openai", "fp", "no embedding"), "SELECT 2")
+        
+        rows = store.load_embeddings("fp")
+        assert len(rows) == 1
+        embedding, sql = rows[0]
+        assert sql == "SELECT * FROM sales"
+        assert np.allclose(embedding, [0.6, 0.8])
+        assert store.load_embeddings("other-fp") == []
+    
+    def test_invalidate_by_prompt_version(self, store):
+        current = ExactMatchCache.make_key("openai", "fp", "q")
+        old = ("v0",) + current[1:]
+        store.put(current, "SELECT 1")
+        store.put(old, "SELECT 0")
+        
+        assert store.invalidate("v0") == 1
+        assert store.get(old) is None
+        assert store.get(current) == "SELECT 1"
+        assert store.invalidate() == 1
@@ -1,13 +1,48 @@
 import pytest
 import os
+import asyncio
+import difflib
+import threading
+import json
+import httpx
+import numpy as np
+import openai
 from unittest.mock import patch, MagicMock
 from core.llm_processor import (
     generate_sql_with_openai, 
     generate_sql_with_anthropic, 
     format_schema_for_prompt,
-    generate_sql
+    generate_sql,
+    generate_sql_async,
+    clear_sql_cache,
+    get_openai_client,
+    get_async_openai_client,
+    get_async_anthropic_client,
+    aclose_llm_clients,
+    reset_llm_clients,
+    reset_circuit_breakers,
+    get_routing_policy,
+    invalidate_cache,
+    load_warmup_queries,
+    prewarm_sql_cache
 )
 from core.data_models import QueryRequest
+from core.llm_cache import SQLiteCacheStore, schema_fingerprint
+from core.llm_errors import ProviderDown, RateLimited, AuthError
+
+
+@pytest.fixture(autouse=True)
+def reset_sql_cache():
+    """Start every test with empty caches, fresh SDK clients, closed circuits and re-read env"""
+    clear_sql_cache()
+    reset_llm_clients()
+    reset_circuit_breakers()
+    get_routing_policy.cache_clear()
+    yield
+    clear_sql_cache()
+    reset_llm_clients()
+    reset_circuit_breakers()
+    get_routing_policy.cache_clear()
 
 
 class TestLLMProcessor:
@@ -19,7 +54,8 @@ class TestLLMProcessor:
         mock_openai_class.return_value = mock_client
         
         mock_response = MagicMock()
-        mock_response.choices[0].message.content = "SELECT * FROM users WHERE age > 25"
+        mock_response.choices[0].message.tool_calls[0].function.arguments = json.dumps(
+            {"sql": "SELECT * FROM users WHERE age > 25"})
         mock_client.chat.completions.create.return_value = mock_response
         
         # Mock environment variable
@@ -42,17 +78,80 @@ class TestLLMProcessor:
             # Verify the API call parameters
             call_args = mock_client.chat.completions.create.call_args
             assert call_args[1]['model'] == 'gpt-4.1-mini'
-            assert call_args[1]['temperature'] == 0.1
+            assert call_args[1]['temperature'] == 0.0
+            assert call_args[1]['seed'] == 42
             assert call_args[1]['max_tokens'] == 500
+            assert call_args[1]['tools'][0]['function']['name'] == 'emit_sql'
+            assert call_args[1]['tool_choice'] == {'type': 'function', 'function': {'name': 'emit_sql'}}
+            
+            # Schema goes in the system prefix, the question comes last
+            messages = call_args[1]['messages']
+            assert "Table: users" in messages[0]['content']
+            assert query_text not in messages[0]['content']
+            assert query_text in messages[-1]['content']
+    
+    @patch('core.llm_processor.OpenAI')
+    def test_openai_client_reused(self, mock_openai_class):
+        # Clients are built once per API key and then shared
+        first = get_openai_client('key-a')
+        second = get_openai_client('key-a')
+        other = get_openai_client('key-b')
+        
+        assert first is second
+        assert mock_openai_class.call_count == 2
+        assert mock_openai_class.call_args_list[0][1]['api_key'] == 'key-a'
+        assert mock_openai_class.call_args_list[1][1]['api_key'] == 'key-b'
+    
+    def test_async_clients_share_http_pool(self):
+        # Both async SDK clients on a loop are built on the same HTTP client
+        async def build_and_close():
+            get_async_openai_client('key-a')
+            get_async_anthropic_client('key-b')
+            await aclose_llm_clients()
+        
+        with patch('core.llm_processor.AsyncOpenAI') as mock_openai_class, \
+                patch('core.llm_processor.AsyncAnthropic') as mock_anthropic_class:
+            asyncio.run(build_and_close())
+        
+        openai_http = mock_openai_class.call_args[1]['http_client']
+        anthropic_http = mock_anthropic_class.call_args[1]['http_client']
+        assert openai_http is anthropic_http
+        assert openai_http.is_closed
+    
+    def test_async_clients_per_event_loop(self):
+        # A pool bound to one loop is never handed to another
+        async def get_client():
+            return get_async_openai_client('key-a')
+        
+        with patch('core.llm_processor.AsyncOpenAI') as mock_openai_class:
+            asyncio.run(get_client())
+            asyncio.run(get_client())
+        
+        first_http, second_http = (c[1]['http_client'] for c in mock_openai_class.call_args_list)
+        assert first_http is not second_http
+    
+    def test_reset_closes_async_pool(self):
+        loop = asyncio.new_event_loop()
+        try:
+            with patch('core.llm_processor.AsyncOpenAI') as mock_openai_class:
+                async def get_client():
+                    return get_async_openai_client('key-a')
+                loop.run_until_complete(get_client())
+            http_client = mock_openai_class.call_args[1]['http_client']
+            
+            reset_llm_clients()
+            assert http_client.is_closed
+        finally:
+            loop.close()
     
     @patch('core.llm_processor.OpenAI')
-    def test_generate_sql_with_openai_clean_markdown(self, mock_openai_class):
-        # Test SQL cleanup from markdown
+    def test_generate_sql_with_openai_tool_output_stripped(self, mock_openai_class):
+        # SQL is read from the emit_sql tool arguments, minus surrounding whitespace
         mock_client = MagicMock()
         mock_openai_class.return_value = mock_client
         
         mock_response = MagicMock()
-        mock_response.choices[0].message.content = "```sql\nSELECT * FROM users\n```"
+        mock_response.choices[0].message.tool_calls[0].function.arguments = '{"sql": "\\nSELECT * FROM users\\n"}'
         mock_client.chat.completions.create.return_value = mock_response
         
         with patch.dict(os.environ, {'OPENAI_API_KEY': 'test-key'}):
@@ -97,7 +196,7 @@ class TestLLMProcessor:
         mock_anthropic_class.return_value = mock_client
         
         mock_response = MagicMock()
-        mock_response.content[0].text = "SELECT * FROM products WHERE price < 100"
+        mock_response.content = [MagicMock(type="tool_use", input={"sql": "SELECT * FROM products WHERE price < 100"})]
         mock_client.messages.create.return_value = mock_response
         
         # Mock environment variable
@@ -120,17 +219,29 @@ class TestLLMProcessor:
             # Verify the API call parameters
             call_args = mock_client.messages.create.call_args
             assert call_args[1]['model'] == 'claude-3-haiku-20240307'
-            assert call_args[1]['temperature'] == 0.1
+            assert call_args[1]['temperature'] == 0.0
             assert call_args[1]['max_tokens'] == 500
+            assert call_args[1]['tools'][0]['name'] == 'emit_sql'
+            assert call_args[1]['tool_choice'] == {'type': 'tool', 'name': 'emit_sql'}
+            
+            # Schema goes in the cached system prefix, the question comes last
+            system_block = call_args[1]['system'][0]
+            assert "Table: products" in system_block['text']
+            assert system_block['cache_control'] == {'type': 'ephemeral'}
+            assert query_text not in system_block['text']
+            assert query_text in call_args[1]['messages'][-1]['content']
     
     @patch('core.llm_processor.Anthropic')
-    def test_generate_sql_with_anthropic_clean_markdown(self, mock_anthropic_class):
-        # Test SQL cleanup from markdown
+    def test_generate_sql_with_anthropic_tool_block(self, mock_anthropic_class):
+        # Any text before the tool call is ignored
         mock_client = MagicMock()
         mock_anthropic_class.return_value = mock_client
         
         mock_response = MagicMock()
-        mock_response.content[0].text = "```\nSELECT * FROM orders\n```"
+        mock_response.content = [
+            MagicMock(type="text", text="Here is the query:"),
+            MagicMock(type="tool_use", input={"sql": "SELECT * FROM orders"}),
+        ]
         mock_client.messages.create.return_value = mock_response
         
         with patch.dict(os.environ, {'ANTHROPIC_API_KEY': 'test-key'}):
@@ -194,6 +305,83 @@ class TestLLMProcessor:
         assert "Row count: 100" in result
         assert "Row count: 50" in result
     
+    @patch('core.llm_processor._format_schema_impl')
+    def test_format_schema_for_prompt_memoized(self, mock_impl):
+        # A schema with a known fingerprint is only formatted once
+        mock_impl.return_value = "Table: users"
+        schema_info = {'tables': {'users': {'columns': {'id': 'INTEGER'}, 'row_count': 1}}}
+        schema_fp = schema_fingerprint(schema_info)
+        
+        assert format_schema_for_prompt(schema_info, schema_fp) == "Table: users"
+        assert format_schema_for_prompt(dict(schema_info), schema_fp) == "Table: users"
+        mock_impl.assert_called_once()
+    
+    @patch('core.llm_processor.OpenAI')
+    def test_generate_sql_fingerprints_schema_once(self, mock_openai_class):
+        # Hashing the schema costs more than formatting it, so it happens once per request
+        mock_client = MagicMock()
+        mock_openai_class.return_value = mock_client
+        mock_client.chat.completions.create.return_value.choices[0].message.tool_calls[0].function.arguments = '{"sql": "SELECT 1"}'
+        schema_info = {'tables': {'users': {'columns': {'id': 'INTEGER'}, 'row_count': 1}}}
+        
+        with patch('core.llm_processor.schema_fingerprint', wraps=schema_fingerprint) as mock_fp, \
+                patch.dict(os.environ, {'OPENAI_API_KEY': 'openai-key'}, clear=True):
+            generate_sql(QueryRequest(query="What is the largest user id"), schema_info)
+        
+        assert mock_fp.call_count == 1
+        system_prompt = mock_client.chat.completions.create.call_args[1]['messages'][0]['content']
+        assert "Table: users" in system_prompt
+    
+    @patch('core.llm_processor.OpenAI')
+    def test_large_schema_pruned_to_relevant_tables(self, mock_openai_class):
+        # Wide schemas only send the tables the question refers to
+        mock_client = MagicMock()
+        mock_openai_class.return_value = mock_client
+        mock_client.chat.completions.create.return_value.choices[0].message.tool_calls[0].function.arguments = '{"sql": "SELECT 1"}'
+        
+        wide_columns = {f'col_{i}': 'TEXT' for i in range(40)}
+        schema_info = {'tables': {
+            'customers': {'columns': {'id': 'INTEGER', 'name': 'TEXT'}, 'row_count': 10},
+            'orders': {'columns': {'id': 'INTEGER', 'customer_id': 'INTEGER', 'total': 'REAL'}, 'row_count': 10},
+            **{f'audit_log_{i}': {'columns': wide_columns, 'row_count': 10} for i in range(20)},
+        }}
+        
+        with patch.dict(os.environ, {'OPENAI_API_KEY': 'test-key'}):
+            generate_sql_with_openai("What is the total of each customer's orders", schema_info)
+        
+        system_prompt = mock_client.chat.completions.create.call_args[1]['messages'][0]['content']
+        assert "Table: orders" in system_prompt
+        assert "Table: customers" in system_prompt
+        assert "Table: audit_log_19" not in system_prompt
+    
+    @patch('core.llm_processor._sql_cache')
+    @patch('core.llm_processor.difflib.get_close_matches', wraps=difflib.get_close_matches)
+    @patch('core.llm_processor.OpenAI')
+    def test_pruned_schema_memoized_per_question(self, mock_openai_class, mock_close_matches, mock_sql_cache):
+        # Repeating a question against the same wide schema skips the fuzzy matching
+        mock_sql_cache.get.return_value = None
+        mock_client = MagicMock()
+        mock_openai_class.return_value = mock_client
+        mock_client.chat.completions.create.return_value.choices[0].message.tool_calls[0].function.arguments = '{"sql": "SELECT 1"}'
+        
+        wide_columns = {f'col_{i}': 'TEXT' for i in range(40)}
+        schema_info = {'tables': {
+            'orders': {'columns': {'id': 'INTEGER', 'total': 'REAL'}, 'row_count': 10},
+            **{f'audit_log_{i}': {'columns': wide_columns, 'row_count': 10} for i in range(20)},
+        }}
+        
+        with patch.dict(os.environ, {'OPENAI_API_KEY': 'openai-key'}, clear=True):
+            # The SQL cache is bypassed, so the prompt is built both times
+            generate_sql(QueryRequest(query="What is the total of all orders"), schema_info)
+            calls_after_first = mock_close_matches.call_count
+            generate_sql(QueryRequest(query="What is the total of all orders"), schema_info)
+        
+        assert calls_after_first > 0
+        assert mock_close_matches.call_count == calls_after_first
+        prompts = [c[1]['messages'][0]['content'] for c in mock_client.chat.completions.create.call_args_list]
+        assert prompts[0] == prompts[1]
+        assert "Table: audit_log_19" not in prompts[1]
+    
     def test_format_schema_for_prompt_empty(self):
         # Test with empty schema
         schema_info = {'tables': {}}
@@ -284,4 +472,427 @@ class TestLLMProcessor:
             result = generate_sql(request, schema_info)
             
             assert result == "SELECT * FROM sales"
-            mock_openai_func.assert_called_once_with("Show sales data", schema_info)
\ No newline at end of file
+            mock_openai_func.assert_called_once_with("Show sales data", schema_info)
+    
+    @patch('core.llm_processor.generate_sql_with_anthropic')
+    def test_generate_sql_caches_repeated_query(self, mock_anthropic_func):
+        # Identical query and schema should only hit the LLM once
+        mock_anthropic_func.return_value = "SELECT * FROM users"
+        
+        with patch.dict(os.environ, {'ANTHROPIC_API_KEY': 'anthropic-key'}, clear=True):
+            request = QueryRequest(query="Show users who signed up this year")
+            schema_info = {'tables': {'users': {'columns': {'id': 'INTEGER'}, 'row_count': 1}}}
+            
+            assert generate_sql(request, schema_info) == "SELECT * FROM users"
+            assert generate_sql(request, schema_info) == "SELECT * FROM users"
+            mock_anthropic_func.assert_called_once()
+            
+            # A schema change is a different cache entry
+            changed_schema = {'tables': {'users': {'columns': {'id': 'INTEGER'}, 'row_count': 2}}}
+            generate_sql(request, changed_schema)
+            assert mock_anthropic_func.call_count == 2
+    
+    @patch('core.llm_processor.embed_query')
+    @patch('core.llm_processor.generate_sql_with_anthropic')
+    def test_generate_sql_semantic_cache_hit(self, mock_anthropic_func, mock_embed):
+        # Paraphrased queries with near-identical embeddings reuse the SQL
+        mock_anthropic_func.return_value = "SELECT * FROM sales"
+        mock_embed.side_effect = [np.array([1.0, 0.0]), np.array([0.99, 0.05])]
+        
+        env = {'ANTHROPIC_API_KEY': 'anthropic-key', 'SEMANTIC_CACHE_ENABLED': 'true'}
+        with patch.dict(os.environ, env, clear=True):
+            schema_info = {'tables': {}}
+            
+            first = generate_sql(QueryRequest(query="sales last week"), schema_info)
+            second = generate_sql(QueryRequest(query="sales in the past 7 days"), schema_info)
+            
+            assert first == second == "SELECT * FROM sales"
+            mock_anthropic_func.assert_called_once()
+
+    
+    @patch('core.llm_processor.generate_sql_with_openai')
+    @patch('core.llm_processor.generate_sql_with_anthropic')
+    def test_generate_sql_falls_back_on_failure(self, mock_anthropic_func, mock_openai_func):
+        # A failing primary provider falls through to the other one
+        mock_anthropic_func.side_effect = ProviderDown("Error generating SQL with Anthropic: down")
+        mock_openai_func.return_value = "SELECT * FROM users"
+        
+        with patch.dict(os.environ, {'OPENAI_API_KEY': 'openai-key', 'ANTHROPIC_API_KEY': 'anthropic-key'}, clear=True):
+            result = generate_sql(QueryRequest(query="Show all users"), {'tables': {}})
+            
+            assert result == "SELECT * FROM users"
+    
+    @patch('core.llm_processor.generate_sql_with_openai')
+    @patch('core.llm_processor.generate_sql_with_anthropic')
+    def test_generate_sql_skips_open_circuit(self, mock_anthropic_func, mock_openai_func):
+        # After repeated failures the primary is not called at all
+        mock_anthropic_func.side_effect = ProviderDown("Error generating SQL with Anthropic: down")
+        mock_openai_func.return_value = "SELECT 1"
+        
+        with patch.dict(os.environ, {'OPENAI_API_KEY': 'openai-key', 'ANTHROPIC_API_KEY': 'anthropic-key'}, clear=True):
+            for i in range(5):
+                generate_sql(QueryRequest(query=f"query {i}"), {'tables': {}})
+            assert mock_anthropic_func.call_count == 5
+            
+            generate_sql(QueryRequest(query="another query"), {'tables': {}})
+            assert mock_anthropic_func.call_count == 5
+            assert mock_openai_func.call_count == 6
+    
+    @patch('core.llm_processor.OpenAI')
+    def test_generate_sql_with_openai_rate_limited(self, mock_openai_class):
+        # SDK errors are mapped onto retryable / permanent provider errors
+        mock_client = MagicMock()
+        mock_openai_class.return_value = mock_client
+        response = httpx.Response(429, request=httpx.Request("POST", "https://api.openai.com/v1/chat/completions"))
+        mock_client.chat.completions.create.side_effect = openai.RateLimitError("slow down", response=response, body=None)
+        
+        with patch.dict(os.environ, {'OPENAI_API_KEY': 'test-key'}):
+            with pytest.raises(RateLimited) as exc_info:
+                generate_sql_with_openai("Show all users", {'tables': {}})
+        
+        assert "Error generating SQL with OpenAI: slow down" in str(exc_info.value)
+    
+    @patch('core.llm_processor.generate_sql_with_openai')
+    @patch('core.llm_processor.generate_sql_with_anthropic')
+    def test_generate_sql_auth_error_does_not_fall_back(self, mock_anthropic_func, mock_openai_func):
+        # A bad key is permanent, so the other provider is not tried
+        mock_anthropic_func.side_effect = AuthError("Error generating SQL with Anthropic: invalid x-api-key")
+        
+        with patch.dict(os.environ, {'OPENAI_API_KEY': 'openai-key', 'ANTHROPIC_API_KEY': 'anthropic-key'}, clear=True):
+            with pytest.raises(AuthError):
+                generate_sql(QueryRequest(query="Show all users"), {'tables': {}})
+        
+        mock_openai_func.assert_not_called()
+    
+    @patch('core.llm_processor.generate_sql_with_anthropic')
+    def test_generate_sql_single_provider_error(self, mock_anthropic_func):
+        # With no other provider the original error is raised
+        mock_anthropic_func.side_effect = Exception("Error generating SQL with Anthropic: down")
+        
+        with patch.dict(os.environ, {'ANTHROPIC_API_KEY': 'anthropic-key'}, clear=True):
+            with pytest.raises(Exception) as exc_info:
+                generate_sql(QueryRequest(query="Show all users"), {'tables': {}})
+            
+            assert "Error generating SQL with Anthropic: down" in str(exc_info.value)
+
+    
+    @patch('core.llm_processor._sql_cache')
+    @patch('core.llm_processor.generate_sql_with_anthropic')
+    def test_generate_sql_rechecks_cache_after_taking_key(self, mock_anthropic_func, mock_cache):
+        # The first lookup misses, but a previous leader stored the SQL before we took the key
+        mock_cache.get.side_effect = [None, "SELECT 1"]
+        
+        with patch.dict(os.environ, {'ANTHROPIC_API_KEY': 'anthropic-key'}, clear=True):
+            result = generate_sql(QueryRequest(query="sales by region"), {'tables': {}})
+        
+        assert result == "SELECT 1"
+        mock_anthropic_func.assert_not_called()
+    
+    def test_routing_policy_read_once(self):
+        # Routing flags are resolved once and reused until the cache is cleared
+        with patch.dict(os.environ, {'ANTHROPIC_API_KEY': 'anthropic-key', 'OPENAI_API_KEY': 'openai-key'}, clear=True):
+            policy = get_routing_policy()
+            assert policy.providers_in_priority == ("anthropic", "openai")
+            
+            os.environ['ANTHROPIC_ENABLED'] = 'false'
+            assert get_routing_policy() is policy
+            
+            get_routing_policy.cache_clear()
+            assert get_routing_policy().providers_in_priority == ("openai",)
+
+    
+    @patch('core.llm_processor.generate_sql_with_anthropic')
+    def test_generate_sql_uses_persistent_cache(self, mock_anthropic_func, tmp_path):
+        # SQL survives clearing the in-memory caches when a store is configured
+        mock_anthropic_func.return_value = "SELECT * FROM users"
+        store = SQLiteCacheStore(str(tmp_path / "llm_cache.db"))
+        
+        with patch('core.llm_processor._persistent_cache', store), \
+                patch.dict(os.environ, {'ANTHROPIC_API_KEY': 'anthropic-key'}, clear=True):
+            request = QueryRequest(query="Show all users")
+            generate_sql(request, {'tables': {}})
+            clear_sql_cache()
+            
+            assert generate_sql(request, {'tables': {}}) == "SELECT * FROM users"
+            mock_anthropic_func.assert_called_once()
+            
+            assert invalidate_cache() == 1
+            generate_sql(request, {'tables': {}})
+            assert mock_anthropic_func.call_count == 2
+        store.close()
+
+    
+    @patch('core.llm_processor.generate_sql_with_anthropic')
+    def test_generate_sql_coalesces_concurrent_requests(self, mock_anthropic_func):
+        # Concurrent identical questions share a single LLM call
+        release = threading.Event()
+        started = threading.Event()
+        
+        def slow_anthropic(query_text, schema_info):
+            started.set()
+            release.wait(5)
+            return "SELECT * FROM users"
+        
+        mock_anthropic_func.side_effect = slow_anthropic
+        results = []
+        
+        with patch.dict(os.environ, {'ANTHROPIC_API_KEY': 'anthropic-key'}, clear=True):
+            request = QueryRequest(query="Show all users")
+            first = threading.Thread(target=lambda: results.append(generate_sql(request, {'tables': {}})))
+            first.start()
+            started.wait(5)
+            
+            second = threading.Thread(target=lambda: results.append(generate_sql(request, {'tables': {}})))
+            second.start()
+            # Give the second caller time to join the in-flight request
+            second.join(0.1)
+            release.set()
+            first.join(5)
+            second.join(5)
+        
+        assert results == ["SELECT * FROM users", "SELECT * FROM users"]
+        mock_anthropic_func.assert_called_once()
+
+    
+    @pytest.mark.parametrize("query,expected", [
+        ("Show all users", "SELECT * FROM [users]"),
+        ("list the Users table", "SELECT * FROM [users]"),
+        ("How many orders?", "SELECT COUNT(*) FROM [orders]"),
+        ("count rows in users", "SELECT COUNT(*) FROM [users]"),
+    ])
+    @patch('core.llm_processor.generate_sql_with_anthropic')
+    def test_generate_sql_rule_based(self, mock_anthropic_func, query, expected):
+        # Trivial questions about an existing table skip the LLM
+        schema_info = {'tables': {
+            'users': {'columns': {'id': 'INTEGER'}, 'row_count': 1},
+            'orders': {'columns': {'id': 'INTEGER'}, 'row_count': 1},
+        }}
+        
+        with patch.dict(os.environ, {'ANTHROPIC_API_KEY': 'anthropic-key'}, clear=True):
+            assert generate_sql(QueryRequest(query=query), schema_info) == expected
+        
+        mock_anthropic_func.assert_not_called()
+    
+    @patch('core.llm_processor.generate_sql_with_anthropic')
+    def test_generate_sql_rule_based_unknown_table(self, mock_anthropic_func):
+        # A table that isn't in the schema goes to the LLM
+        mock_anthropic_func.return_value = "SELECT * FROM customers"
+        schema_info = {'tables': {'users': {'columns': {'id': 'INTEGER'}, 'row_count': 1}}}
+        
+        with patch.dict(os.environ, {'ANTHROPIC_API_KEY': 'anthropic-key'}, clear=True):
+            assert generate_sql(QueryRequest(query="Show all customers"), schema_info) == "SELECT * FROM customers"
+        
+        mock_anthropic_func.assert_called_once()
+
+
+class TestGenerateSqlAsync:
+    
+    BOTH_KEYS = {'ANTHROPIC_API_KEY': 'anthropic-key', 'OPENAI_API_KEY': 'openai-key'}
+    
+    @patch('core.llm_processor.HEDGE_DELAY_SECONDS', 0.01)
+    @patch('core.llm_processor.generate_sql_with_openai_async')
+    @patch('core.llm_processor.generate_sql_with_anthropic_async')
+    def test_fast_primary_skips_hedge(self, mock_anthropic, mock_openai):
+        mock_anthropic.return_value = "SELECT 1"
+        
+        with patch.dict(os.environ, self.BOTH_KEYS, clear=True):
+            result = asyncio.run(generate_sql_async(QueryRequest(query="q"), {'tables': {}}))
+        
+        assert result == "SELECT 1"
+        mock_openai.assert_not_called()
+    
+    @patch('core.llm_processor.HEDGE_DELAY_SECONDS', 0.01)
+    @patch('core.llm_processor.generate_sql_with_openai_async')
+    @patch('core.llm_processor.generate_sql_with_anthropic_async')
+    def test_slow_primary_is_hedged(self, mock_anthropic, mock_openai):
+        cancelled = []
+        
+        async def slow_anthropic(query_text, schema_info):
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+            return "SELECT 1"
+        
+        mock_anthropic.side_effect = slow_anthropic
+        mock_openai.return_value = "SELECT 2"
+        
+        with patch.dict(os.environ, self.BOTH_KEYS, clear=True):
+            result = asyncio.run(generate_sql_async(QueryRequest(query="q"), {'tables': {}}))
+        
+        assert result == "SELECT 2"
+        assert cancelled == [True]
+    
+    @patch('core.llm_processor.HEDGE_DELAY_SECONDS', 5)
+    @patch('core.llm_processor.generate_sql_with_openai_async')
+    @patch('core.llm_processor.generate_sql_with_anthropic_async')
+    def test_failed_primary_falls_back(self, mock_anthropic, mock_openai):
+        mock_anthropic.side_effect = ProviderDown("Error generating SQL with Anthropic: down")
+        mock_openai.return_value = "SELECT 2"
+        
+        with patch.dict(os.environ, self.BOTH_KEYS, clear=True):
+            result = asyncio.run(generate_sql_async(QueryRequest(query="q"), {'tables': {}}))
+        
+        assert result == "SELECT 2"
+    
+    @patch('core.llm_processor.HEDGE_DELAY_SECONDS', 0.01)
+    @patch('core.llm_processor.generate_sql_with_openai_async')
+    @patch('core.llm_processor.generate_sql_with_anthropic_async')
+    def test_both_fail_raises_primary_error(self, mock_anthropic, mock_openai):
+        mock_anthropic.side_effect = ProviderDown("Error generating SQL with Anthropic: down")
+        mock_openai.side_effect = ProviderDown("Error generating SQL with OpenAI: down")
+        
+        with patch.dict(os.environ, self.BOTH_KEYS, clear=True):
+            with pytest.raises(Exception) as exc_info:
+                asyncio.run(generate_sql_async(QueryRequest(query="q"), {'tables': {}}))
+        
+        assert "Anthropic" in str(exc_info.value)
+    
+    @patch('core.llm_processor.HEDGE_DELAY_SECONDS', 5)
+    @patch('core.llm_processor.generate_sql_with_openai_async')
+    @patch('core.llm_processor.generate_sql_with_anthropic_async')
+    def test_permanent_primary_error_not_hedged(self, mock_anthropic, mock_openai):
+        mock_anthropic.side_effect = AuthError("Error generating SQL with Anthropic: invalid x-api-key")
+        
+        with patch.dict(os.environ, self.BOTH_KEYS, clear=True):
+            with pytest.raises(AuthError):
+                asyncio.run(generate_sql_async(QueryRequest(query="q"), {'tables': {}}))
+        
+        mock_openai.assert_not_called()
+    
+    @patch('core.llm_processor.generate_sql_with_openai_async')
+    @patch('core.llm_processor.generate_sql_with_anthropic_async')
+    def test_single_provider_not_hedged(self, mock_anthropic, mock_openai):
+        mock_openai.return_value = "SELECT 2"
+        
+        with patch.dict(os.environ, {'OPENAI_API_KEY': 'openai-key'}, clear=True):
+            result = asyncio.run(generate_sql_async(QueryRequest(query="q"), {'tables': {}}))
+        
+        assert result == "SELECT 2"
+        mock_anthropic.assert_not_called()
+    
+    @patch('core.llm_processor._sql_cache')
+    @patch('core.llm_processor.generate_sql_with_anthropic_async')
+    def test_rechecks_cache_after_taking_key(self, mock_anthropic, mock_cache):
+        mock_cache.get.side_effect = [None, "SELECT 1"]
+        
+        with patch.dict(os.environ, {'ANTHROPIC_API_KEY': 'anthropic-key'}, clear=True):
+            result = asyncio.run(generate_sql_async(QueryRequest(query="sales by region"), {'tables': {}}))
+        
+        assert result == "SELECT 1"
+        mock_anthropic.assert_not_called()
+    
+    @patch('core.llm_processor.generate_sql_with_anthropic_async')
+    def test_concurrent_identical_requests_share_call(self, mock_anthropic):
+        async def slow_anthropic(query_text, schema_info):
+            await asyncio.sleep(0.05)
+            return "SELECT 1"
+        
+        mock_anthropic.side_effect = slow_anthropic
+        
+        async def run_both():
+            request = QueryRequest(query="q")
+            return await asyncio.gather(
+                generate_sql_async(request, {'tables': {}}),
+                generate_sql_async(request, {'tables': {}}),
+            )
+        
+        with patch.dict(os.environ, {'ANTHROPIC_API_KEY': 'anthropic-key'}, clear=True):
+            results = asyncio.run(run_both())
+        
+        assert results == ["SELECT 1", "SELECT 1"]
+        mock_anthropic.assert_called_once()
+    
+    @patch('core.llm_processor.AsyncOpenAI')
+    def test_new_schema_formatted_off_event_loop(self, mock_openai_class):
+        mock_client = MagicMock()
+        mock_openai_class.return_value = mock_client
+        create = mock_client.chat.completions.create
+        
+        async def fake_create(**kwargs):
+            response = MagicMock()
+            response.choices[0].message.tool_calls[0].function.arguments = '{"sql": "SELECT 1"}'
+            return response
+        
+        create.side_effect = fake_create
+        schema_info = {'tables': {'users': {'columns': {'id': 'INTEGER'}, 'row_count': 1}}}
+        format_threads = []
+        
+        def record_thread(schema):
+            format_threads.append(threading.current_thread())
+            return "Table: users"
+        
+        async def run_twice():
+            await generate_sql_async(QueryRequest(query="first question"), schema_info)
+            await generate_sql_async(QueryRequest(query="second question"), schema_info)
+        
+        with patch('core.llm_processor._format_schema_impl', side_effect=record_thread), \
+                patch('core.llm_processor.schema_fingerprint', wraps=schema_fingerprint) as mock_fp, \
+                patch.dict(os.environ, {'OPENAI_API_KEY': 'openai-key'}, clear=True):
+            asyncio.run(run_twice())
+        
+        # Formatted once, on a worker thread; the second call reuses the cached text
+        # without hashing the schema again on the event loop
+        assert len(format_threads) == 1
+        assert mock_fp.call_count == 2
+        assert format_threads[0] is not threading.main_thread()
+        assert create.call_count == 2
+
+
+class TestPrewarm:
+    
+    def test_load_warmup_queries_most_common_first(self, tmp_path):
+        log = tmp_path / "warmup_queries.jsonl"
+        log.write_text(
+            '{"query": "sales by region"}\n'
+            '{"query": "top customers"}\n'
+            'not json\n'
+            '{"query": "top customers"}\n'
+        )
+        
+        with patch('core.llm_processor.WARMUP_QUERIES_PATH', str(log)):
+            assert load_warmup_queries() == ["top customers", "sales by region"]
+            assert load_warmup_queries(limit=1) == ["top customers"]
+    
+    @patch('core.llm_processor._WARMUP_LOG_MAX_LINES', 3)
+    @patch('core.llm_processor.generate_sql_with_anthropic')
+    def test_warmup_log_is_bounded(self, mock_anthropic_func, tmp_path):
+        log = tmp_path / "warmup_queries.jsonl"
+        mock_anthropic_func.return_value = "SELECT 1"
+        
+        with patch('core.llm_processor.WARMUP_QUERIES_PATH', str(log)), \
+                patch.dict(os.environ, {'ANTHROPIC_API_KEY': 'anthropic-key'}, clear=True):
+            for i in range(7):
+                generate_sql(QueryRequest(query=f"question {i}"), {'tables': {}})
+            # Cut back to the newest lines after every 3 appends
+            assert len(log.read_text().splitlines()) <= 6
+            
+            # Loading also drops everything but the newest lines from the file
+            assert sorted(load_warmup_queries()) == ["question 4", "question 5", "question 6"]
+            assert len(log.read_text().splitlines()) == 3
+    
+    def test_load_warmup_queries_missing_file(self, tmp_path):
+        with patch('core.llm_processor.WARMUP_QUERIES_PATH', str(tmp_path / "missing.jsonl")):
+            assert load_warmup_queries() == []
+    
+    @patch('core.llm_processor.generate_sql_with_anthropic_async')
+    def test_misses_logged_and_prewarmed(self, mock_anthropic, tmp_path):
+        log = tmp_path / "warmup_queries.jsonl"
+        mock_anthropic.return_value = "SELECT 1"
+        
+        with patch('core.llm_processor.WARMUP_QUERIES_PATH', str(log)), \
+                patch.dict(os.environ, {'ANTHROPIC_API_KEY': 'anthropic-key'}, clear=True):
+            asyncio.run(generate_sql_async(QueryRequest(query="top customers"), {'tables': {}}))
+            assert load_warmup_queries() == ["top customers"]
+            
+            # A fresh process: the logged question is generated before anyone asks
+            clear_sql_cache()
+            warmed = asyncio.run(prewarm_sql_cache(load_warmup_queries(), {'tables': {}}))
+            assert warmed == 1
+            assert mock_anthropic.call_count == 2
+            
+            # Prewarm generations are not logged again, and the real request is a cache hit
+            assert len(log.read_text().splitlines()) == 1
+            assert asyncio.run(generate_sql_async(QueryRequest(query="top customers"), {'tables': {}})) == "SELECT 1"
+            assert mock_anthropic.call_count == 2